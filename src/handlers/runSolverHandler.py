@@ -2,19 +2,39 @@
 
 from __future__ import unicode_literals
 
+from collections import deque
+import functools
 import logging
+import os
 import time
 import json
 
 from tornado.web import HTTPError, asynchronous
 from tornado.websocket import WebSocketHandler
 from tornado import gen
-import gevent
-from gevent.socket import wait_read, timeout
+from tornado.ioloop import IOLoop
 
 from tools import model
-from mlbExceptions import SolverException
+from mlbExceptions import MLBenchException, SolverException
 from tools.utils import lcFirst
+from conf import Conf
+
+# number of bytes waiting to be sent on the websocket above which the client
+# is considered as lagging behind: the messages are then held back
+MAX_BUFFERED_BYTES = 1024 * 1024
+# maximum number of bytes of the log and forced messages held back
+MAX_HELD_BYTES = 1024 * 1024
+# while the client lags behind, the log messages of a lower level are dropped
+MIN_HELD_LOG_LEVEL = 3
+# time between two attempts to send the messages held back, in seconds
+DRAIN_INTERVAL = 0.05
+# bounds of the minimum time between two viz messages imposed to the solver
+# when the client lags behind, in seconds
+MIN_VIZ_INTERVAL = 0.1
+MAX_VIZ_INTERVAL = 5.0
+# minimum time between two changes of the viz interval of the solver
+VIZ_INTERVAL_UPDATE = 1.0
+DROPPED_LOGS_FRAME = json.dumps({'log': {'message': '[...]', 'level': 0}})
 
 
 class RunSolverHandler(WebSocketHandler):
@@ -22,12 +42,26 @@ class RunSolverHandler(WebSocketHandler):
     def initialize(self):
         logging.info("Initializing")
         self._runningSolver = None
+        self._telemetry = None
+        # messages held back while the client lags behind: the log and forced
+        # messages in order, and the most recent viz and msr messages
+        self._held = deque()
+        self._heldBytes = 0
+        self._heldViz = None
+        self._heldMsr = None
+        self._droppedLogs = False
+        self._draining = False
+        # minimum time between two viz messages asked by the client, and
+        # currently imposed to the solver
+        self._vizHint = 0.0
+        self._vizInterval = 0.0
+        self._lastVizIntervalUpdate = 0
 
     def open(self):
         logging.info("Websocket created.")
 
     @gen.coroutine
-    def onRunSolver(self, solverId):
+    def onRunSolver(self, solverId, resume=False):
         solver = yield model.getService('solvers').getById(solverId)
         logging.info("Runnning %s: %s" % (solver['type'], solver['name']))
 
@@ -47,22 +81,30 @@ class RunSolverHandler(WebSocketHandler):
         solverInstance = getattr(solverImplemModule, solver['implementation'])(
             solver['name'], problemInstance, **solver['parameters'])
         self._runningSolver = solverInstance
+        solverInstance.setVizInterval(self._vizHint)
+        self._vizInterval = self._vizHint
+        # save the state of the solver periodically, to be able to resume
+        # the run if it stops before the end
+        solverInstance.setCheckpoint(
+            os.path.join(Conf['checkpoints']['folder'], '%s.json' % solverId),
+            interval=Conf['checkpoints']['interval'], resume=resume)
 
         # run the solver algorithm on a different process
         logging.info("Starting process")
         solverInstance.start()
 
-        # spawn the greenlets that will forward data read on the pipes to
-        # the websocket
-        logging.info("Spawning forwarders")
-        logThread = gevent.spawn(
-            self.pipe2SocketForwarder, 'log', solverInstance.getLogOutput())
-        vizThread = gevent.spawn(
-            self.pipe2SocketForwarder, 'viz', solverInstance.getVizOutput())
-        msrThread = gevent.spawn(
-            self.pipe2SocketForwarder, 'msr',
-            solverInstance.getMeasureOutput())
-        gevent.joinall([logThread, vizThread, msrThread])
+        # forward the data sent by the solver to the websocket as soon as it
+        # is available. The solver process holds the writing end of the
+        # signal pipe now, its end of file marks the end of the process.
+        logging.info("Starting channel to socket forwarder...")
+        self._telemetry = solverInstance.getTelemetryOutput()
+        self._telemetry.closeWriter()
+        self._forwarded = 0
+        self._forwardStart = time.time()
+        IOLoop.current().add_handler(
+            self._telemetry.fileno(),
+            functools.partial(self.channel2SocketForwarder, self._telemetry),
+            IOLoop.READ)
 
     def onKillRunningSolver(self):
         if self._runningSolver:
@@ -75,19 +117,25 @@ class RunSolverHandler(WebSocketHandler):
         Message sent to this handler via the websocket connection should be
         json-encoded objects with the following structure:
         {
-            "action": "<action>", # where <action> can be either run or kill
+            "action": "<action>", # where <action> can be run, kill or fps
             "solver": "<solverId>", # the id of the solver to run
+            "resume": <boolean>, # optional, false by default
         }
         If <action> is "run", this will initiate a new run for the specified
-        solver. As the solver is running, messages will be sent to the client
-        through the websocket to send log and visualization information. See
-        `pipe2SocketForwarder` function for more details about the format of
-        these messages.
+        solver. If "resume" is true and the last run of this solver has been
+        interrupted, the run will start again from its last checkpoint. As
+        the solver is running, messages will be sent to the client through
+        the websocket to send log and visualization information. See
+        `channel2SocketForwarder` function for more details about the format
+        of these messages.
         Note: an exception will be thrown and the message '{error: "[...]"}'
         will be sent if a solver is already running.
         If <action> is "kill", this will kill any running solver (whatever is
         specified in the "solver" field). You should use this action before
         starting another one to avoid any error.
+        If <action> is "fps", the message should have the field "fps": the
+        maximum number of viz messages per second the client can display.
+        The solver will not send them at a higher rate.
         """
         logging.info("Received message: %s" % message)
         message = json.loads(message)
@@ -97,23 +145,142 @@ class RunSolverHandler(WebSocketHandler):
             if not 'solver' in message:
                 raise MLBenchException(
                     "Mis-formatted message: %s" % str(message))
-            self.onRunSolver(message['solver'])
+            self.onRunSolver(message['solver'],
+                             resume=bool(message.get('resume', False)))
         if message['action'] == 'kill':
             self.onKillRunningSolver()
+        if message['action'] == 'fps':
+            if not 'fps' in message or float(message['fps']) <= 0:
+                raise MLBenchException(
+                    "Mis-formatted message: %s" % str(message))
+            self._vizHint = 1.0 / float(message['fps'])
+            self._setVizInterval(self._vizHint)
 
     def on_close(self):
         logging.info("Websocket closed.")
+        self._stopForwarder()
 
-    @gen.coroutine
-    def pipe2SocketForwarder(self, name, pipe):
+    def _stopForwarder(self):
+        if self._telemetry is not None:
+            IOLoop.current().remove_handler(self._telemetry.fileno())
+            self._telemetry.close()
+            self._telemetry = None
+            logging.info("Stats: %d messages forwarded in %.3fs"
+                         % (self._forwarded,
+                            time.time() - self._forwardStart))
+
+    def _buffered(self):
+        """
+        Returns the number of bytes waiting to be sent on the websocket.
+        Note: this reads a private attribute of the tornado IOStream, which
+        depends on the version of tornado (the one of requirements.txt).
+        Without it, the client is always considered as keeping up.
+        """
+        stream = getattr(self.ws_connection, 'stream', None)
+        return getattr(stream, '_write_buffer_size', 0) or 0
+
+    def _write(self, frame):
+        self.write_message(frame)
+        self._forwarded += 1
+
+    def _setVizInterval(self, interval):
+        self._vizInterval = max(interval, self._vizHint)
+        self._lastVizIntervalUpdate = time.time()
+        if self._runningSolver is not None:
+            self._runningSolver.setVizInterval(self._vizInterval)
+
+    def _forward(self, name, level, frame):
+        """
+        Send a message to the client, or hold it back if the client lags
+        behind. In that case, only the most recent viz and msr messages are
+        kept (unless they were forced), the log messages of a level lower
+        than `MIN_HELD_LOG_LEVEL` are dropped, and the solver is asked to
+        send viz messages less often. The memory used by the messages held
+        back is bounded: the oldest ones are dropped first.
+        """
+        if not self._held and self._heldViz is None and \
+                self._heldMsr is None and \
+                self._buffered() < MAX_BUFFERED_BYTES:
+            self._write(frame)
+            self._relaxVizInterval()
+            return
+        if name == 'viz' and not level:
+            if self._heldViz is not None and \
+                    time.time() - self._lastVizIntervalUpdate > \
+                    VIZ_INTERVAL_UPDATE:
+                # the viz messages arrive faster than they are sent
+                self._setVizInterval(min(
+                    MAX_VIZ_INTERVAL,
+                    max(MIN_VIZ_INTERVAL, 2 * self._vizInterval)))
+            self._heldViz = frame
+        elif name == 'msr' and not level:
+            self._heldMsr = frame
+        elif name == 'log' and level < MIN_HELD_LOG_LEVEL:
+            self._droppedLogs = True
+        else:
+            self._held.append(frame)
+            self._heldBytes += len(frame)
+            while self._heldBytes > MAX_HELD_BYTES and len(self._held) > 1:
+                self._heldBytes -= len(self._held.popleft())
+                self._droppedLogs = True
+        if not self._draining:
+            self._draining = True
+            IOLoop.current().call_later(DRAIN_INTERVAL, self._drain)
+
+    def _drain(self):
+        """
+        Send the messages held back, as long as the client keeps up.
+        """
+        self._draining = False
+        if self.ws_connection is None:
+            # the websocket is closed
+            self._held.clear()
+            self._heldBytes = 0
+            self._heldViz = self._heldMsr = None
+            return
+        if self._droppedLogs and self._buffered() < MAX_BUFFERED_BYTES:
+            self._droppedLogs = False
+            self._write(DROPPED_LOGS_FRAME)
+        while self._held and self._buffered() < MAX_BUFFERED_BYTES:
+            frame = self._held.popleft()
+            self._heldBytes -= len(frame)
+            self._write(frame)
+        if not self._held and self._buffered() < MAX_BUFFERED_BYTES:
+            for frame in [self._heldMsr, self._heldViz]:
+                if frame is not None:
+                    self._write(frame)
+            self._heldViz = self._heldMsr = None
+        if self._held or self._heldViz is not None or \
+                self._heldMsr is not None:
+            self._draining = True
+            IOLoop.current().call_later(DRAIN_INTERVAL, self._drain)
+        else:
+            self._relaxVizInterval()
+
+    def _relaxVizInterval(self):
+        """
+        Let the solver send viz messages more often again, once the client
+        caught up.
+        """
+        if self._vizInterval > self._vizHint and \
+                time.time() - self._lastVizIntervalUpdate > \
+                VIZ_INTERVAL_UPDATE:
+            self._setVizInterval(self._vizInterval / 2
+                                 if self._vizInterval > MIN_VIZ_INTERVAL
+                                 else 0)
+
+    def channel2SocketForwarder(self, channel, fd, events):
         """
-        Forward data read from the log and visualization pipes to the
-        websocket.
+        Forward the log, visualization and measurement data read from the
+        telemetry channel of the solver to the websocket, in the order they
+        were sent. Called by the IOLoop whenever the channel is readable.
         The format of the messages sent is a json-encoded object with the
         following structure:
         {
-            <name>: <object sent over the pipe>
+            <name>: <object sent over the channel>
         }
+        The messages are encoded by the solver process, and forwarded as
+        is.
         Where `<name>` can be either "log", "viz" or "msr".
 
         * The `log` object will be a dict having the key `message`
@@ -127,31 +294,25 @@ class RunSolverHandler(WebSocketHandler):
         More information on the format of the objects can be found in the
         doctstring in each solver.
         """
-        logging.info("Starting %s to socket forwarder..." % name)
-        loops = 0
-        start_t = time.time()
-        # the loop will stop once the solver is killed or the task is finished
-        while self._runningSolver.is_alive() or pipe.poll():
-            loops += 1
-            # wait 'till something is available to read
-            logging.debug("Waiting for something to read on the pipe...")
-            try:
-                wait_read(pipe.fileno(), timeout=0)
-            except timeout:
-                # no data to read, no data to send, just wait and try again
-                yield gen.sleep(0.1)
-                continue
-            # read the data (shouldn't block as called wait_read)
-            msg = pipe.recv()
-            # send the json-encoded data
-            data = json.dumps({name: msg})
-            logging.debug("Sending data: %s" % (data))
-            self.write_message(data)
-            # return control to tornado's ioloop
-            yield gen.sleep(0)
-
-        # once the loop is stopped, log some messages
-        logging.info("Stopping forwarder -- running solver is not alive \
+        if channel is not self._telemetry:
+            # stopped meanwhile
+            return
+        for name, level, frame in channel.receive():
+            # the data is json-encoded by the solver process already
+            logging.debug("Sending data: %s" % (frame))
+            self._forward(name, level, frame)
+        if channel is not self._telemetry:
+            # the websocket was closed while forwarding
+            return
+        if channel.pending():
+            # written while forwarding, without signal: forward them on the
+            # next iteration of the IOLoop
+            IOLoop.current().add_callback(
+                self.channel2SocketForwarder, channel, fd, events)
+            return
+        # the channel is closed once the solver is killed or the task is
+        # finished
+        if channel.isClosed():
+            logging.info("Stopping forwarder -- running solver is not alive \
 anymore. ")
-        logging.info("Stats: %d loops done in %.3fs"
-                     % (loops, time.time() - start_t))
+            self._stopForwarder()
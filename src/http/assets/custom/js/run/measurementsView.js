@@ -38,13 +38,13 @@ function MeasurementsView ($viewContainer) {
     // Called when a new measurement is performed.
     // the measurement object should at least have the `_time` property.
     // if no other field is present, this function does nothing. Otherwise,
-    // a data point is added to the graph for each other property.
-    // Each property's value is expected to be a number.
+    // a data point is added to the graph for each other numeric property
+    // (other values, such as the `_window` aggregates, are ignored).
     self.onMeasure = function (measure) {
         var x = new Date(measure._time * 1000); // seconds to microseconds
         var toAdd = [];
         for (var property in measure) {
-            if (property == '_time')
+            if (property == '_time' || typeof measure[property] !== 'number')
                 continue;
             // retrieve corresponding group
             var group = self._groups.get(property)
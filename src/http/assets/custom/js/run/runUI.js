@@ -19,6 +19,14 @@ function RunUI($uiContainer) {
 
     self._runningSolver = null;
 
+    // maximum number of viz messages displayed per second. The hint sent to
+    // the server is lowered when the views take too long to display them.
+    self.MAX_FPS = 30;
+    self._fpsHint = null;
+    self._vizRenderTime = 0;
+    self._vizRendered = 0;
+    self._lastFpsUpdate = 0;
+
     self._retrieveSolvers = function () {
         self._selectizeSolver.clear();
         self._selectizeSolver.clearOptions();
@@ -69,14 +77,38 @@ function RunUI($uiContainer) {
                 self.dynamicLoadViews(data.viz);
             }
             else {
+                var start = Date.now();
                 if (self._problemView)
                     self._problemView.onData(data.viz);
                 if (self._solverView)
                     self._problemView.onData(data.viz);
+                self._vizRenderTime += Date.now() - start;
+                self._vizRendered++;
+                self._updateFpsHint();
             }
         }
     }
 
+    // send the server the number of viz messages per second the views can
+    // display, leaving half of the time to the rest of the page.
+    self._updateFpsHint = function () {
+        var now = Date.now();
+        if (now - self._lastFpsUpdate < 1000)
+            return;
+        var meanRenderTime = self._vizRendered ? self._vizRenderTime / self._vizRendered : 0;
+        var fps = Math.max(1, Math.min(self.MAX_FPS, Math.floor(500 / Math.max(meanRenderTime, 1))));
+        self._vizRenderTime = 0;
+        self._vizRendered = 0;
+        self._lastFpsUpdate = now;
+        if (fps != self._fpsHint && self._webSocket.readyState == WebSocket.OPEN) {
+            self._fpsHint = fps;
+            self._webSocket.send(JSON.stringify({
+                action: 'fps',
+                fps: fps
+            }));
+        }
+    }
+
     self.initialize = function () {
         self._$uiContainer.find('#select-solver').selectize({
             create: true,
@@ -92,7 +124,12 @@ function RunUI($uiContainer) {
         self._solverForm.initialize();
         self._solverFormModal = $.UIkit.stackableModal('#create-solver-modal');
 
-        self._$uiContainer.find('#run-solver').click(self.onRun);
+        self._$uiContainer.find('#run-solver').click(function () {
+            self.onRun(false);
+        });
+        self._$uiContainer.find('#resume-solver').click(function () {
+            self.onRun(true);
+        });
 
         self._logView = new LogView($('#log-panel'));
         self._measurementsView = new MeasurementsView($('#measurements-panel'));
@@ -176,8 +213,9 @@ function RunUI($uiContainer) {
         }
     }
 
-    // called when the user click on the 'Run' button
-    self.onRun = function () {
+    // called when the user click on the 'Run' button, or on the 'Resume'
+    // button (`resume` is true) to start again from the last checkpoint.
+    self.onRun = function (resume) {
         self._webSocket = new WebSocket('ws://localhost:5000/api/run/');
         self._webSocket.onmessage = self._onSocketMessage
         self._webSocket.onopen = function () {
@@ -190,9 +228,13 @@ function RunUI($uiContainer) {
             }
             else
                 self._selectizeSolver.$control.removeClass('invalid');
+            self._fpsHint = null;
+            self._lastFpsUpdate = 0;
+            self._updateFpsHint();
             self._webSocket.send(JSON.stringify({
                 action: 'run',
-                solver: solverId
+                solver: solverId,
+                resume: resume
             }));
             self._runningSolver = self._solversById[solverId];
         };
@@ -27,3 +27,10 @@ class ProblemException(MLBenchException):
         self._problemTypes = problemTypes
         self._name = name
         self._parameters = parameters
+
+
+class ExpressionException(MLBenchException):
+    """
+    Exception raised when a user-defined expression is invalid or unsafe.
+    """
+    pass
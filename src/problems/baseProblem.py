@@ -62,6 +62,22 @@ class BaseProblem(object):
         """
         return {}
 
+    def getState(self):
+        """
+        Any data of the problem that is not defined by its parameters (e.g.:
+        randomly generated during the initialization) should be returned as a
+        JSON-compatible dict by this function. This state is saved along with
+        the checkpoints of the solvers, and restored using `setState` when
+        resuming a run.
+        """
+        return {}
+
+    def setState(self, state):
+        """
+        Restore the state of the problem, as returned by `getState`.
+        """
+        pass
+
     def viz(self, vizData):
         """
         Everytime the solver is sending data to the solverView
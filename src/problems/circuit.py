@@ -5,7 +5,9 @@ from __future__ import unicode_literals
 import math
 import random
 
-from optimization import Optimization
+import numpy as np
+
+from optimization import Optimization, SwapNeighborhood
 
 
 def sqr(x):
@@ -20,6 +22,92 @@ def euclidean(p1, p2):
     return sqr(p1[0] - p2[0]) + sqr(p1[1] - p2[1])
 
 
+def cityblockArray(deltas):
+    """
+    Vectorized version of `cityblock`, given an array of coordinate
+    differences of shape (..., 2).
+    """
+    return np.abs(deltas).sum(axis=-1)
+
+
+def euclideanArray(deltas):
+    """
+    Vectorized version of `euclidean`, given an array of coordinate
+    differences of shape (..., 2).
+    """
+    return (deltas * deltas).sum(axis=-1)
+
+
+class CircuitSwapNeighborhood(SwapNeighborhood):
+    """
+    Vectorized computation of the evaluation changes of all the swap moves
+    over a circuit.
+    Given `D`, the matrix of the distances between the components, and `A`
+    the adjacency matrix of the circuit, `F = A.D` holds in `F[a, b]` the
+    length of the connections of the component `a` if it were located at the
+    position of the component `b`. The change caused by swapping `a` and `b`
+    is then `F[a, b] + F[b, a] - F[a, a] - F[b, b] + 2 * A[a, b] * D[a, b]`.
+    Each component having at most 4 neighbors, the row `a` of `F` is computed
+    as the sum of the rows of `D` of the neighbors of `a`.
+    When a move is applied, only the rows and columns of the swapped
+    components and of their neighbors are updated.
+    """
+    def __init__(self, problem, solution, value):
+        size = len(solution)
+        self._adjacency = np.zeros((size, size))
+        self._adjacency[problem._edges[:, 0], problem._edges[:, 1]] = 1
+        self._adjacency[problem._edges[:, 1], problem._edges[:, 0]] = 1
+        super(CircuitSwapNeighborhood, self).__init__(
+            problem, solution, value)
+
+    def _computeDeltas(self):
+        solution = np.asarray(self._solution).astype(int)
+        size = len(solution)
+        if self._value >= self._problem._invalid:
+            return np.zeros((size, size))
+        self._distances = self._problem.getDistanceTable()[
+            np.ix_(solution, solution)].astype(float)
+        self._lengths = np.empty((size, size))
+        for component, neighbors in enumerate(self._problem._neighbors):
+            self._lengths[component] = self._distances[neighbors].sum(axis=0)
+        return self._deltaRows(np.arange(size))
+
+    def _deltaRows(self, rows):
+        """
+        Compute the rows `rows` of the matrix of evaluation changes.
+        """
+        lengths = self._lengths
+        own = lengths.diagonal()
+        return lengths[rows] + lengths[:, rows].T - own[rows, None] - \
+            own[None, :] + 2 * self._adjacency[rows] * self._distances[rows]
+
+    def apply(self, move):
+        i, j = move
+        if i == j:
+            return
+        if self._value >= self._problem._invalid:
+            return super(CircuitSwapNeighborhood, self).apply(move)
+        self._value = self._value + self._deltas[i, j]
+        self._solution[i], self._solution[j] = \
+            self._solution[j], self._solution[i]
+        swapped = [i, j]
+        # the swapped components exchange their distances to the others
+        self._distances[swapped, :] = self._distances[[j, i], :]
+        self._distances[:, swapped] = self._distances[:, [j, i]]
+        # so are their columns in F, and the rows of their neighbors change.
+        self._lengths[:, swapped] = self._lengths[:, [j, i]]
+        neighbors = sorted(set(self._problem._neighbors[i]) |
+                           set(self._problem._neighbors[j]))
+        for component in neighbors:
+            self._lengths[component] = self._distances[
+                self._problem._neighbors[component]].sum(axis=0)
+        # the changes involving any of these components are updated
+        changed = np.array(sorted(set(neighbors) | set(swapped)))
+        rows = self._deltaRows(changed)
+        self._deltas[changed, :] = rows
+        self._deltas[:, changed] = rows.T
+
+
 class Circuit(Optimization):
     """
     This optimization problem is an electronic circuit where each
@@ -34,19 +122,83 @@ class Circuit(Optimization):
     * `distance`: the distance function to use. Accepted values are:
       'euclidean' (the default) and 'cityblock'. Any other value will be
       ignored and 'euclidean' will be used instead.
+    * `cacheEntries`: maximum number of evaluations kept in memory to avoid
+      evaluating the same solution twice. 0 (the default) to disable.
+    * `cacheBytes`: approximate maximum memory used to keep the evaluations,
+      in bytes. 0 (the default) for no limit other than `cacheEntries`.
     """
-    def __init__(self, name, dataset, width=5, height=5, distance='euclidean'):
+    def __init__(self, name, dataset, width=5, height=5, distance='euclidean',
+                 cacheEntries=0, cacheBytes=0):
         super(Circuit, self).__init__(
             name=name, dataset=dataset, width=width, height=height,
-            distance=distance)
+            distance=distance, cacheEntries=cacheEntries,
+            cacheBytes=cacheBytes)
         self._width = int(width)
         self._height = int(height)
         self._distance = cityblock if distance == 'cityblock' \
             else euclidean
+        self._distanceArray = cityblockArray if distance == 'cityblock' \
+            else euclideanArray
         # _shuffle adds one more step when evaluating the solution.
         # to avoid the 'perfect' solution to always be [0, 1, 2, 3 ... ]
         self._shuffle = [x for x in xrange(self._width * self._height)]
         random.shuffle(self._shuffle)
+        self._computeTables()
+
+    def _computeTables(self):
+        """
+        Compute the tables used by the evaluation functions, once the
+        components have been shuffled.
+        """
+        # actual coordinates of the component located at each position.
+        # This convert the virtual 1D grid into the coordinates in the
+        # virtual 2D circuit to allow distance computation.
+        shuffle = np.array(self._shuffle, dtype=int)
+        self._coords = np.column_stack((shuffle % self._width * 5,
+                                        shuffle // self._height * 5))
+        # pairs of connected components: the component (x, y) - found at
+        # index x + y * width in a solution - and its right and down neighbors
+        grid = np.arange(self._width * self._height).reshape(
+            self._height, self._width)
+        self._edges = np.concatenate((
+            np.column_stack((grid[:, :-1].ravel(), grid[:, 1:].ravel())),
+            np.column_stack((grid[:-1, :].ravel(), grid[1:, :].ravel()))))
+        # distance between the components located at each pair of positions
+        self._distanceTable = self._distanceArray(
+            self._coords[:, None, :] - self._coords[None, :, :])
+        # same data, as python lists for the evaluation of single moves
+        self._coordsList = [tuple(point) for point in self._coords.tolist()]
+        self._neighbors = [[] for i in xrange(self._width * self._height)]
+        for component, neighbor in self._edges.tolist():
+            self._neighbors[component].append(neighbor)
+            self._neighbors[neighbor].append(component)
+        # evaluation of the solutions that contain duplicates
+        self._invalid = (self._width * self._height * 25) ** 2
+
+    def getDistanceTable(self):
+        """
+        Returns the square matrix of the distances between the positions: the
+        connection between two components located at the positions `p` and
+        `q` has a length of `getDistanceTable()[p, q]`.
+        """
+        return self._distanceTable
+
+    def getConnections(self):
+        """
+        Returns the pairs of connected components, as an int array of shape
+        (nbConnections, 2). The evaluation of a solution is the sum of the
+        length of these connections.
+        """
+        return self._edges
+
+    def getState(self):
+        return {'shuffle': self._shuffle}
+
+    def setState(self, state):
+        self._shuffle = state['shuffle']
+        self._computeTables()
+        # the evaluations depend on the tables
+        self.clearCache()
 
     def initView(self):
         return {
@@ -69,58 +221,95 @@ class Circuit(Optimization):
             for i in xrange(self._width * self._height)
         ]
 
+    def symmetries(self):
+        """
+        The connections of the components grid are the same once the grid is
+        mirrored or rotated: placing each component at the position of its
+        image gives the same total length. This is 4 symmetries for a
+        rectangular circuit and 8 for a square one.
+        """
+        x, y = np.meshgrid(np.arange(self._width), np.arange(self._height))
+        transforms = [(x, y), (self._width - 1 - x, y),
+                      (x, self._height - 1 - y),
+                      (self._width - 1 - x, self._height - 1 - y)]
+        if self._width == self._height:
+            transforms += [(y, x), (self._width - 1 - y, x),
+                           (y, self._height - 1 - x),
+                           (self._width - 1 - y, self._height - 1 - x)]
+        symmetries = []
+        for tx, ty in transforms:
+            symmetry = (tx + ty * self._width).ravel()
+            # a single row or column has no distinct mirrored version
+            if not any((symmetry == other).all() for other in symmetries):
+                symmetries.append(symmetry)
+        return symmetries
+
     def isBetter(self, evaluation1, evaluation2):
         """
         An evaluation is better than another if it is smaller.
         """
         return evaluation1 < evaluation2
 
+    def _connectionsLength(self, solutions):
+        """
+        Returns the total length of the connections of the given solution, or
+        batch of solutions (int array of shape (..., width * height)).
+        All the coordinates are gathered at once, then the length of each
+        connection is computed and summed up.
+        """
+        points = self._coords[solutions]
+        deltas = points[..., self._edges[:, 0], :] - \
+            points[..., self._edges[:, 1], :]
+        return self._distanceArray(deltas).sum(axis=-1)
+
     def evaluate(self, solution):
         """
         Evaluate the given solution.
         The solution is a single-dimensional array, where the position of the
         component (x, y) can be found at solution[x + y * width].
         """
+        solution = np.asarray(solution).astype(int)
         # contains duplicates
-        if len(set([int(x) for x in solution])) < len(solution):
-            return (self._width * self._height * 25) ** 2
-
-        # map onto a grid
-        def componentsPosition(x, y):
-            """
-            Returns the position of the component (x, y) as defined in the
-            given solution
-            """
-            return int(solution[x + y * self._width])
-
-        def pos2Coord(pos):
-            """
-            Returns the actual coordinates of the component that is located
-            at position `pos`.
-            This convert the virtual 1D grid into the coordinates in the
-            virtual 2D circuit to allow distance computation.
-            """
-            # transform a solution value into a 2 components position
-            return (self._shuffle[pos] % self._width * 5,
-                    self._shuffle[pos] / self._height * 5)
-
-        def computeCnxLen(compo):
-            """
-            Compute the length of the connexion between the given
-            component and its neighbors (right and down) using the
-            distribution given by the solution.
-            """
-            # compo = (row, col)
-            length = 0
-            if compo[0] + 1 < self._width:
-                length += self._distance(
-                    pos2Coord(componentsPosition(compo[0], compo[1])),
-                    pos2Coord(componentsPosition(compo[0] + 1, compo[1])))
-            if compo[1] + 1 < self._height:
-                length += self._distance(
-                    pos2Coord(componentsPosition(compo[0], compo[1])),
-                    pos2Coord(componentsPosition(compo[0], compo[1] + 1)))
-            return length
-
-        return sum(computeCnxLen((x, y)) for x in xrange(self._width)
-                   for y in xrange(self._height))
+        if len(np.unique(solution)) < len(solution):
+            return self._invalid
+        return self._connectionsLength(solution).item()
+
+    def evaluateDelta(self, solution, currentValue, move):
+        """
+        Evaluate the solution obtained by swapping the positions of two
+        components. Only the connections of these two components are
+        computed (at most 4 each), whatever the size of the circuit.
+        * move:tuple (i, j), the indices of the two swapped components
+        """
+        i, j = move
+        # swapping doesn't remove duplicates
+        if i == j or currentValue >= self._invalid:
+            return currentValue
+        coords = self._coordsList
+        delta = 0
+        for component, other in ((i, j), (j, i)):
+            old = coords[int(solution[component])]
+            new = coords[int(solution[other])]
+            for neighbor in self._neighbors[component]:
+                # the connection between i and j keeps the same length
+                if neighbor != other:
+                    point = coords[int(solution[neighbor])]
+                    delta += self._distance(new, point) - \
+                        self._distance(old, point)
+        return currentValue + delta
+
+    def swapNeighborhood(self, solution, value):
+        return CircuitSwapNeighborhood(self, solution, value)
+
+    def evaluateBatch(self, solutions):
+        """
+        Evaluate all the given solutions (one per row) at once.
+        """
+        solutions = np.asarray(solutions).astype(int)
+        evaluations = self._connectionsLength(solutions)
+        # solutions that contains duplicates
+        sortedSolutions = np.sort(solutions, axis=1)
+        duplicates = (sortedSolutions[:, 1:] == sortedSolutions[:, :-1])\
+            .any(axis=1)
+        evaluations[duplicates] = self._invalid
+        return evaluations.astype(float)
@@ -2,9 +2,17 @@
 
 from __future__ import unicode_literals
 
+import numpy as np
+
 from optimization import Optimization
+from tools.expression import CompiledExpression
+from mlbExceptions import ExpressionException, ProblemException
 
 DEFAULT_EXP = 'sum(x[i] ** i for i in xrange(len(x)))'
+# number of random solutions used to check the numpy evaluation of the
+# expression against its python evaluation, in addition to the corners of
+# the scope
+CHECKED_SOLUTIONS = 8
 
 
 class Function(Optimization):
@@ -13,23 +21,44 @@ class Function(Optimization):
     the solver will try to find a global minimum). The parameters are:
     * `expression`, the function expression, that should be a python function
       of the variable `x`, a vector that has an entry for each dimension of the
-      function
+      function. Only arithmetic, comparisons, comprehensions, the `math` module
+      and the functions `len`, `range`, `xrange`, `sum`, `abs`, `min`, `max`,
+      `pow`, `float`, `int` and `round` can be used.
     * `dimension`, number of dimensions of the function
     * `rangeMin`, minimum value each dimension can have
     * `rangeMax`, maximum value each dimension can have
     * `goal`, whether the function should be maximized or minimized. Accepted
       value are 'max', 'maxi', 'maxim', ... and '1'. All other value will
       result in the function being miminized.
+    * `cacheEntries`, maximum number of evaluations kept in memory to avoid
+      evaluating the same solution twice. 0 (the default) to disable.
+    * `cacheBytes`, approximate maximum memory used to keep the evaluations,
+      in bytes. 0 (the default) for no limit other than `cacheEntries`.
     """
     def __init__(self, name, dataset, expression=DEFAULT_EXP,
-                 dimension=10, rangeMin=0, rangeMax=100, goal='minimize'):
+                 dimension=10, rangeMin=0, rangeMax=100, goal='minimize',
+                 cacheEntries=0, cacheBytes=0):
         super(Function, self).__init__(
             name=name, dataset=dataset,
             dimension=dimension, rangeMin=rangeMin, rangeMax=rangeMax,
-            goal=goal)
+            goal=goal, cacheEntries=cacheEntries, cacheBytes=cacheBytes)
         self._dimension = int(dimension)
         self._expression = expression
+        # parse and compile the expression once and for all
+        try:
+            self._compiled = CompiledExpression(expression)
+        except ExpressionException as e:
+            raise ProblemException(
+                ['optimization'], name, {'expression': expression}, str(e))
         self._range = (int(rangeMin), int(rangeMax))
+        # the numpy evaluation of the expression is only used if it gives the
+        # same results as the python one
+        low, high = self._range
+        self._compiled.checkBatch(np.vstack([
+            np.full((1, self._dimension), low, dtype=float),
+            np.full((1, self._dimension), high, dtype=float),
+            np.random.RandomState(0).uniform(
+                low, high, (CHECKED_SOLUTIONS, self._dimension))]))
         self._goal = 1 if str(goal).lower()[:3] == 'max' or str(goal) == '1'\
             else -1
 
@@ -40,7 +69,41 @@ class Function(Optimization):
         * solution should be an array of float, of the same size than the array
           returned by the `getScope` function.
         """
-        return eval(self._expression, {'x': solution})
+        return self._compiled(solution)
+
+    def evaluateBatch(self, solutions):
+        """
+        Evaluate all the given solutions at once. Expressions that have been
+        lowered to numpy operations during the initialization are computed
+        over the whole batch, the other ones are evaluated one solution at a
+        time.
+        """
+        try:
+            # the invalid values are evaluated again below
+            with np.errstate(all='ignore'):
+                evaluations = self._compiled.evaluateBatch(solutions)
+        except (ArithmeticError, ValueError, IndexError, TypeError):
+            # let the evaluation of each solution raise the appropriate
+            # exception, if any.
+            return self._evaluateEach(solutions)
+        # numpy returns nan or inf where the evaluation of a single solution
+        # raises (log of a negative number, division by zero, overflow...):
+        # evaluate these solutions one at a time, for the same result.
+        invalid = ~np.isfinite(evaluations)
+        if invalid.any():
+            evaluations[invalid] = self._evaluateEach(
+                np.asarray(solutions, dtype=float)[invalid])
+        return evaluations
+
+    def _evaluateEach(self, solutions):
+        """
+        Evaluate the given solutions one at a time, as python lists. The
+        evaluation cache is not used: the batch evaluation is cached already.
+        """
+        return np.array(
+            [self._compiled(solution)
+             for solution in np.asarray(solutions, dtype=float).tolist()],
+            dtype=float)
 
     def isBetter(self, evaluation1, evaluation2):
         return evaluation1 * self._goal > evaluation2 * self._goal
@@ -2,7 +2,61 @@
 
 from __future__ import unicode_literals
 
+import numpy as np
+
 from baseProblem import BaseProblem
+from tools.cache import EvaluationCache
+
+
+class SwapNeighborhood(object):
+    """
+    Holds the evaluation change of every move that swaps two variables of a
+    solution: `getDeltas()[i, j]` is the difference between the evaluation
+    of the solution with the variables `i` and `j` swapped and the evaluation
+    of the solution itself.
+    This default implementation calls `evaluateDelta` for each pair of
+    variables, and computes everything again each time a move is applied.
+    """
+    def __init__(self, problem, solution, value):
+        """
+        * problem:Optimization, the problem the solution is evaluated for.
+        * solution: the current solution.
+        * value:float, the evaluation of `solution`.
+        """
+        super(SwapNeighborhood, self).__init__()
+        self._problem = problem
+        self._solution = list(solution)
+        self._value = value
+        self._deltas = self._computeDeltas()
+
+    def _computeDeltas(self):
+        size = len(self._solution)
+        deltas = np.zeros((size, size))
+        for i in xrange(size):
+            for j in xrange(i + 1, size):
+                deltas[i, j] = deltas[j, i] = self._problem.evaluateDelta(
+                    self._solution, self._value, (i, j)) - self._value
+        return deltas
+
+    def getSolution(self):
+        return self._solution
+
+    def getValue(self):
+        return self._value
+
+    def getDeltas(self):
+        return self._deltas
+
+    def apply(self, move):
+        """
+        Swap the two variables given by `move` (a tuple of indices) in the
+        current solution, and update the evaluation changes accordingly.
+        """
+        i, j = move
+        self._value = self._value + self._deltas[i, j]
+        self._solution[i], self._solution[j] = \
+            self._solution[j], self._solution[i]
+        self._deltas = self._computeDeltas()
 
 
 class Optimization(BaseProblem):
@@ -10,11 +64,40 @@ class Optimization(BaseProblem):
     Base class for any optimization problem. An optimizer solver can only
     work on problem classes that inherit from this one.
     All the methods of this class should be overrided.
+    The evaluations can be memoized by setting `cacheEntries` (maximum number
+    of evaluations kept) and/or `cacheBytes` (approximate maximum memory used
+    by the cache). Sub-classes should expose these parameters to the user.
     """
-    def __init__(self, name, dataset=None, **kwargs):
+    def __init__(self, name, dataset=None, cacheEntries=0, cacheBytes=0,
+                 **kwargs):
         super(Optimization, self).__init__(
             problemTypes=['optimization'], name=name, dataset=dataset,
-            **kwargs)
+            cacheEntries=cacheEntries, cacheBytes=cacheBytes, **kwargs)
+        self._cache = None
+        if int(cacheEntries) > 0 or int(cacheBytes) > 0:
+            self._cache = EvaluationCache(cacheEntries, cacheBytes)
+            self.evaluate = self._cache.wrap(self.evaluate)
+            # the default batch evaluation already uses the cached `evaluate`
+            if type(self).evaluateBatch.im_func is not \
+                    Optimization.evaluateBatch.im_func:
+                self.evaluateBatch = self._cache.wrapBatch(
+                    self.evaluateBatch)
+
+    def clearCache(self):
+        """
+        Forget the cached evaluations, if any. Should be called whenever the
+        evaluation of the solutions changes (e.g.: in `setState`).
+        """
+        if self._cache is not None:
+            self._cache.clear()
+
+    def getCacheStats(self):
+        """
+        Returns the counters of the evaluation cache (hits, misses,
+        evictions and number of entries) as a dict, or None if the
+        evaluations are not cached.
+        """
+        return self._cache.getStats() if self._cache is not None else None
 
     def evaluate(self, solution):
         """
@@ -25,6 +108,90 @@ class Optimization(BaseProblem):
         """
         raise NotImplementedError()
 
+    def evaluateBatch(self, solutions):
+        """
+        Evaluate a batch of solutions at once. Returns a one-dimensional numpy
+        array holding the evaluation of each solution, in the same order.
+        * solutions should be a 2D array-like of shape (N, D), where each row
+          is a solution of the same size than the array returned by the
+          `getScope` function.
+        Problems able to evaluate many solutions at once should override this
+        function. The default implementation calls `evaluate` on each row.
+        """
+        return np.array([self.evaluate(solution) for solution in solutions],
+                        dtype=float)
+
+    def evaluateDelta(self, solution, currentValue, move):
+        """
+        Evaluate the solution obtained by applying the given move to
+        `solution`, without modifying it. Returns the evaluation of the new
+        solution.
+        * solution: the current solution, of the same size than the array
+          returned by the `getScope` function.
+        * currentValue:float, the evaluation of `solution`.
+        * move:tuple (i, j), the indices of the two variables whose values are
+          swapped.
+        Problems able to compute how a move changes the evaluation without
+        evaluating the whole solution should override this function. The
+        default implementation evaluates the new solution from scratch.
+        """
+        i, j = move
+        neighbor = list(solution)
+        neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
+        return self.evaluate(neighbor)
+
+    def swapNeighborhood(self, solution, value):
+        """
+        Returns a `SwapNeighborhood` object holding the evaluation change of
+        every possible swap of two variables in the given solution.
+        * solution: the current solution.
+        * value:float, the evaluation of `solution`.
+        Problems that can compute all these changes at once should override
+        this function.
+        """
+        return SwapNeighborhood(self, solution, value)
+
+    def symmetries(self):
+        """
+        Returns the symmetry group of the problem: a list of permutations `g`
+        of the variables (as int arrays) such that the solution `s[g]` always
+        has the same evaluation as `s`. The identity is always part of it.
+        Problems whose solutions have equivalent copies should override this
+        function. The default implementation returns the identity only.
+        """
+        return [np.arange(len(self.getScope()))]
+
+    def canonicalMask(self, solutions):
+        """
+        Returns a boolean array telling, for each given solution (one per
+        row), whether it is canonical: lexicographically smaller than or equal
+        to all its symmetric copies. Each set of symmetric solutions has
+        exactly one canonical solution, so searching among the canonical
+        solutions only still finds the best evaluation.
+        """
+        solutions = np.asarray(solutions)
+        # indices of the solutions that are canonical so far: each symmetry
+        # is only checked against the solutions left by the previous ones.
+        canonical = np.arange(len(solutions))
+        for symmetry in self.symmetries():
+            candidates = solutions[canonical]
+            copies = candidates[:, symmetry]
+            differ = copies != candidates
+            # the first variable that differs decides the order
+            first = np.argmax(differ, axis=1)
+            rows = np.arange(len(candidates))
+            canonical = canonical[~differ.any(axis=1) | (
+                candidates[rows, first] < copies[rows, first])]
+        mask = np.zeros(len(solutions), dtype=bool)
+        mask[canonical] = True
+        return mask
+
+    def isCanonical(self, solution):
+        """
+        Returns True if the given solution is canonical (see `canonicalMask`).
+        """
+        return bool(self.canonicalMask([solution])[0])
+
     def isBetter(self, evaluation1, evaluation2):
         """
         Given two evaluation results, return a boolean that is true
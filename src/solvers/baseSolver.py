@@ -2,12 +2,15 @@
 
 from __future__ import unicode_literals
 
-from multiprocessing import Process, Pipe
+from multiprocessing import Process, Value
+import json
+import os
 import time
 import random
 
 from mlbExceptions import SolverException
 from tools import utils
+from tools.telemetry import TelemetryChannel, LOG, VIZ, MSR
 
 
 class Solution(Exception):
@@ -53,29 +56,46 @@ class BaseSolver(Process):
         self._solverType = solverType
         self._name = name
         self._problem = problem
-        self._logReader, self._logWriter = Pipe(False)
+        # log, viz and msr messages all go through the same channel
+        self._telemetry = TelemetryChannel()
         self._lastLogWrite = time.time()
         self._ignoredLogInfoSent = False
-        self._vizReader, self._vizWriter = Pipe(False)
         self._lastVizWrite = time.time()
-        self._msrReader, self._msrWriter = Pipe(False)
+        # minimum time between two viz messages, set by the server process
+        # when the client can't keep up
+        self._vizInterval = Value(b'd', 0.0, lock=False)
         self._lastMsrWrite = time.time()
+        # most recent viz and msr messages throttled, sent on the next flush,
+        # along with their timeout
+        self._pendingViz = None
+        self._pendingMsr = None
+        # aggregation of the numeric measurements since the last msr message
+        # sent: name -> [min, max, sum, count]
+        self._msrWindow = {}
         self._start_t = time.time()
         self._nbSteps = 0
         self._startTime = None
+        self._checkpointPath = None
+        self._checkpointInterval = None
+        self._lastCheckpoint = time.time()
+        self._resumeFrom = None
 
-    def getLogOutput(self):
-        return self._logReader
-
-    def getVizOutput(self):
-        return self._vizReader
+    def getTelemetryOutput(self):
+        """
+        Returns the channel on which the log, viz and msr messages are sent.
+        """
+        return self._telemetry
 
-    def getMeasureOutput(self):
-        return self._msrReader
+    def setVizInterval(self, interval):
+        """
+        Set the minimum time in seconds between two viz messages, whatever
+        the timeout used by the solver. Can be called from any process.
+        """
+        self._vizInterval.value = float(interval)
 
     def _log(self, message, timeout=0.1, force=False, level=0):
         """
-        Log a message to the log writer. The message can be any json-dumpable
+        Log a message to the log stream. The message can be any json-dumpable
         object.
         If `force` is left to False, the function **will not** be reliable.
         If a message has been already sent in the last `timeout` second, the
@@ -87,43 +107,173 @@ class BaseSolver(Process):
         # print("[LOG][to=%.3fs][force=%s] %s"
         #       % (timeout, str(force), message))
         if force or time.time() - self._lastLogWrite > timeout:
-            self._logWriter.send({'message': message, 'level': level})
+            self._telemetry.send(
+                LOG, {'message': message, 'level': level}, level=level)
             if not force:
                 self._lastLogWrite = time.time()
             self._ignoredLogInfoSent = False
         elif not self._ignoredLogInfoSent:
             self._ignoredLogInfoSent = True
-            self._logWriter.send({'message': '[...]', 'level': 0})
+            self._telemetry.send(LOG, {'message': '[...]', 'level': 0})
 
     def _viz(self, message, timeout=0.1, force=False):
         """
-        Log a message to the viz writer.
-        If `force` is left to False, the function **will not** be reliable.
+        Log a message to the viz stream.
         If a message has been already sent in the last `timeout` second, the
-        message will be discarded to limit the write rate over the socket.
-        Set `force` to True to disable this behaviour (or `timeout` to 0)
-        Note: `message` is expected to be a dict.
+        message will be kept until the next flush (see `_flush`) to limit the
+        write rate over the socket, replacing any message kept before: only
+        the most recent state is sent.
+        Set `force` to True to send the message right away (or `timeout` to
+        0).
+        The timeout can't be lower than the interval set by `setVizInterval`.
+        Note: `message` is expected to be a dict. As it may be sent later, it
+        should not be modified after the call: pass copies of the solutions
+        updated in place.
         """
         # print("[VIZ][to=%.3fs][force=%s] %s"
         #       % (timeout, str(force), message))
+        timeout = max(timeout, self._vizInterval.value)
         if force or time.time() - self._lastVizWrite > timeout:
-            message = utils.extends(message, **self._problem.viz(message))
-            self._vizWriter.send(message)
+            self._sendViz(message, force)
             if not force:
                 self._lastVizWrite = time.time()
+        else:
+            self._pendingViz = (message, timeout)
+
+    def _sendViz(self, message, force=False):
+        self._pendingViz = None
+        message = utils.extends(message, **self._problem.viz(message))
+        # forced messages must not be coalesced by the server
+        self._telemetry.send(VIZ, message, level=int(force))
 
     def _msr(self, message, timeout=1.0, force=False):
         """
-        Log measured data to the measurement pip writer.
-        If `force` is left to False, the function **will not** be reliable.
+        Log measured data to the measurement stream.
         If a message has been already sent in the last `timeout` second, the
-        message will be discarded to limit the write rate over the socket.
-        Set `force` to True to disable this behaviour (or `timeout` to 0)
+        message will be kept until the next flush (see `_flush`) to limit the
+        write rate over the socket, replacing any message kept before.
+        The numeric values are aggregated over the messages that are not
+        sent: the field `_window` of the message sent maps each of them to
+        its `min`, `max`, `mean` and `count` since the last message sent.
+        Set `force` to True to send the message right away (or `timeout` to
+        0).
         """
+        for name, value in message.iteritems():
+            if name == '_time' or isinstance(value, bool) or \
+                    not isinstance(value, (int, long, float)):
+                continue
+            window = self._msrWindow.get(name)
+            if window is None:
+                self._msrWindow[name] = [value, value, value, 1]
+            else:
+                window[0] = min(window[0], value)
+                window[1] = max(window[1], value)
+                window[2] += value
+                window[3] += 1
         if force or time.time() - self._lastMsrWrite > timeout:
-            self._msrWriter.send(message)
+            self._sendMsr(message, force)
             if not force:
                 self._lastMsrWrite = time.time()
+        else:
+            self._pendingMsr = (message, timeout)
+
+    def _sendMsr(self, message, force=False):
+        self._pendingMsr = None
+        message = dict(message, _window={
+            name: {'min': low, 'max': high, 'mean': total / float(count),
+                   'count': count}
+            for name, (low, high, total, count)
+            in self._msrWindow.iteritems()})
+        self._msrWindow = {}
+        self._telemetry.send(MSR, message, level=int(force))
+
+    def _flush(self, force=False):
+        """
+        Send the viz and msr messages kept by `_viz` and `_msr` once their
+        timeout is over, or right away if `force` is True.
+        Called after each step, and when the solver stops.
+        """
+        if self._pendingViz is not None and (
+                force or time.time() - self._lastVizWrite >
+                self._pendingViz[1]):
+            self._sendViz(self._pendingViz[0])
+            self._lastVizWrite = time.time()
+        if self._pendingMsr is not None and (
+                force or time.time() - self._lastMsrWrite >
+                self._pendingMsr[1]):
+            self._sendMsr(self._pendingMsr[0])
+            self._lastMsrWrite = time.time()
+
+    def setCheckpoint(self, path, interval=60.0, resume=False):
+        """
+        Enable the periodic saving of the state of the solver to the given
+        file. Should be called before starting the solver.
+        * path:string, path of the checkpoint file.
+        * interval:float, minimum time in seconds between two checkpoints.
+        * resume:boolean, whether the solver should start again from the
+          state saved in the checkpoint file, if any.
+        """
+        self._checkpointPath = path
+        self._checkpointInterval = float(interval)
+        self._resumeFrom = None
+        if resume and os.path.exists(path):
+            with open(path, 'r') as f:
+                checkpoint = json.load(f)
+            if checkpoint.get('name') == self._name:
+                self._resumeFrom = checkpoint
+
+    def getCheckpoint(self):
+        """
+        Solvers that support checkpoints should return their current state as
+        a JSON-compatible dict. This state should be compact, and enough to
+        start again the solving process from this point using
+        `restoreCheckpoint`.
+        Returns None by default (checkpoints are not supported).
+        """
+        return None
+
+    def restoreCheckpoint(self, state):
+        """
+        Restore the state of the solver, as returned by `getCheckpoint`.
+        Called once, after `initialize` when resuming a run.
+        """
+        pass
+
+    def _checkpoint(self, force=False):
+        """
+        Save the current state of the solver and of the problem to the
+        checkpoint file, if checkpoints are enabled. Unless `force` is True,
+        nothing will be saved if the last checkpoint is more recent than the
+        checkpoint interval, which bounds the cost of the checkpoints.
+        """
+        if self._checkpointPath is None or not force and \
+                time.time() - self._lastCheckpoint < self._checkpointInterval:
+            return
+        self._lastCheckpoint = time.time()
+        state = self.getCheckpoint()
+        if state is None:
+            return
+        folder = os.path.dirname(self._checkpointPath)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        # write to a temporary file first, so that a solver killed while
+        # writing doesn't corrupt the previous checkpoint
+        with open(self._checkpointPath + '.tmp', 'w') as f:
+            json.dump({
+                'name': self._name,
+                'time': self._lastCheckpoint,
+                'problem': self._problem.getState(),
+                'solver': state
+            }, f)
+        os.rename(self._checkpointPath + '.tmp', self._checkpointPath)
+
+    def _clearCheckpoint(self):
+        """
+        Remove the checkpoint file, if any.
+        """
+        if self._checkpointPath is not None and \
+                os.path.exists(self._checkpointPath):
+            os.remove(self._checkpointPath)
 
     def initialize(self):
         """
@@ -206,9 +356,18 @@ class BaseSolver(Process):
         while not self.step():
             self._nbSteps += 1
             measure = self.measure(lastMeasure=measure)
+            self._flush()
+            self._checkpoint()
 
     def run(self):
+        if self._resumeFrom is not None:
+            self._problem.setState(self._resumeFrom['problem'])
         self.initialize()
+        if self._resumeFrom is not None:
+            self.restoreCheckpoint(self._resumeFrom['solver'])
+            self._log('Resumed from the checkpoint of %s'
+                      % utils.dateFormat(self._resumeFrom['time']),
+                      force=True, level=4)
         self._viz({
             'initProblem': self._problem.initView(),
             'initSolver': self.initView()
@@ -216,4 +375,8 @@ class BaseSolver(Process):
         try:
             self.solve()
         except Solution as sol:
+            self._clearCheckpoint()
             print sol
+        finally:
+            # the last state of the solver is always sent
+            self._flush(force=True)
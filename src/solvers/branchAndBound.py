@@ -0,0 +1,231 @@
+# -*- coding: utf8 -*-
+
+from __future__ import unicode_literals
+
+import time
+
+import numpy as np
+
+from optimizer import Optimizer, OptimizationSolution
+from mlbExceptions import SolverException
+
+# number of nodes of the search tree expanded at each step
+NODES_PER_STEP = 200
+
+
+class BranchAndBound(Optimizer):
+    """
+    Exact optimizer for the problems that place connected components on
+    positions, such as the circuits: the evaluation is the sum of the
+    distances between the positions of the connected components.
+    The solution is built component by component. For each partial solution,
+    a lower bound of the evaluation of all the solutions that extend it is
+    computed, and the partial solution is dropped (pruned) if this bound is
+    not better than the best solution found so far. The best solution found
+    is then the optimum.
+    The lower bound is the length of the connections already placed, plus,
+    for each component not placed yet but connected to placed ones, the
+    shortest length of its connections to them among the free positions,
+    plus the shortest distance between two positions for each of the other
+    connections.
+    The problem must provide its distances with `getDistanceTable` and its
+    connections with `getConnections`. Lower evaluations are better.
+    * `symmetry`, int value, set to 1 (the default) to only build the
+      canonical solutions when the problem has symmetries (see the
+      `BruteForce` optimizer). Set to 0 to explore all the solutions.
+    * `restarts`, int value, number of local searches from random solutions
+      performed before the exploration, in addition to the one from the
+      identity. The better the first solution, the more is pruned.
+    """
+    def __init__(self, name, problem, symmetry=1, restarts=50):
+        super(BranchAndBound, self).__init__(name=name, problem=problem)
+        if not hasattr(problem, 'getDistanceTable') or \
+                not hasattr(problem, 'getConnections'):
+            raise SolverException(
+                'optimizer', name,
+                {'symmetry': symmetry, 'restarts': restarts},
+                "The problem does not provide a distance table")
+        if not self._isPermutation() or self._orientation != 1:
+            raise SolverException(
+                'optimizer', name,
+                {'symmetry': symmetry, 'restarts': restarts},
+                "Only problems that minimize over permutations are supported")
+        self._symmetry = bool(int(symmetry))
+        self._restarts = int(restarts)
+        self._bestSol = None
+        self._firstSol = None
+        # lower bound of the evaluation of any solution
+        self._rootBound = None
+        # positions of the components placed so far, and the length of their
+        # connections
+        self._path = []
+        self._costs = []
+        # for each placed component and the next one, the candidate positions
+        # left to explore, as (bound, position, cost) tuples sorted so that
+        # the most promising candidate is the last one.
+        self._candidates = []
+        self._nbNodes = 0
+        self._nbPruned = 0
+        print "Starting Branch and Bound optimizer."
+
+    def initialize(self):
+        super(BranchAndBound, self).initialize()
+        self._distances = np.asarray(
+            self._problem.getDistanceTable(), dtype=float)
+        self._values = np.arange(self._scope[0][1], self._scope[0][2] + 1)
+        size = len(self._scope)
+        connections = np.asarray(self._problem.getConnections())
+        self._neighbors = [[] for i in xrange(size)]
+        for a, b in connections.tolist():
+            self._neighbors[a].append(b)
+            self._neighbors[b].append(a)
+        # shortest distance between two distinct positions
+        offDiagonal = self._distances + np.diag(
+            np.repeat(np.inf, len(self._distances)))
+        self._shortest = offDiagonal.min()
+        # number of connections between the components placed after the
+        # component `k` (both excluded)
+        self._nbFree = [
+            sum(1 for a, b in connections.tolist() if a > k and b > k)
+            for k in xrange(size)]
+        # components that must be placed on a greater value than the first
+        # one for the solution to be canonical
+        self._mirrors = set()
+        if self._symmetry:
+            self._mirrors = set(
+                int(g[0]) for g in self._problem.symmetries()) - set([0])
+        self._rootBound = len(connections) * self._shortest
+        self._firstSol = self._bestSol = self._descent(self._values.tolist())
+        for i in xrange(self._restarts):
+            solution = self._descent(self._randomSolution())
+            if solution[1] < self._bestSol[1]:
+                self._bestSol = solution
+        self._candidates.append(self._expand(0))
+
+    def _descent(self, solution):
+        """
+        Returns a good solution, found by a local search from the given one,
+        that is used to prune the search tree from the start.
+        """
+        neighborhood = self._problem.swapNeighborhood(
+            solution, self._problem.evaluate(solution))
+        while True:
+            deltas = neighborhood.getDeltas()
+            i, j = np.unravel_index(np.argmin(deltas), deltas.shape)
+            if deltas[i, j] >= 0:
+                break
+            neighborhood.apply((i, j))
+        return (list(neighborhood.getSolution()), neighborhood.getValue())
+
+    def _expand(self, k):
+        """
+        Returns the candidate positions of the component `k`, given the
+        positions of the components placed before it, along with their lower
+        bound and the length of the connections placed. The candidates that
+        can't lead to a better solution than the best one are not kept.
+        """
+        free = np.setdiff1d(np.arange(len(self._values)), self._path)
+        positions = free
+        if k in self._mirrors:
+            positions = free[free > self._path[0]]
+        elif k == 0:
+            # leave enough greater values for the mirrors of the component 0
+            positions = free[:len(free) - len(self._mirrors)]
+        # length of the connections of the component k to the placed ones
+        costs = self._costs[-1] if self._costs else 0.0
+        placed = [self._path[a] for a in self._neighbors[k] if a < k]
+        if placed:
+            costs = costs + self._distances[placed][:, positions].sum(axis=0)
+        else:
+            costs = costs + np.zeros(len(positions))
+        bounds = costs + self._nbFree[k] * self._shortest
+        # each component not placed yet but connected to placed ones will be
+        # located on one of the other free positions (rows: position of the
+        # component k, columns: position of the other component)
+        excluded = np.where(positions[:, None] == free[None, :], np.inf, 0.0)
+        for b in set(b for a in range(k + 1) for b in self._neighbors[a]
+                     if b > k):
+            lengths = excluded
+            placed = [self._path[a] for a in self._neighbors[b] if a < k]
+            if placed:
+                lengths = lengths + \
+                    self._distances[placed][:, free].sum(axis=0)
+            if k in self._neighbors[b]:
+                lengths = lengths + self._distances[np.ix_(positions, free)]
+            if len(free) > 1:
+                bounds += lengths.min(axis=1)
+        keep = bounds < self._bestSol[1]
+        self._nbNodes += len(positions)
+        self._nbPruned += len(positions) - keep.sum()
+        # lowest bounds last, then lowest positions last
+        order = np.lexsort((-positions[keep], -bounds[keep]))
+        return zip(bounds[keep][order].tolist(),
+                   positions[keep][order].tolist(),
+                   costs[keep][order].tolist())
+
+    def measure(self, lastMeasure=None, m=None):
+        if m is None:
+            m = {}
+        m['best'] = self._bestSol[1]
+        m['lowerBound'] = self._rootBound
+        m['nodes'] = self._nbNodes
+        m['pruned'] = self._nbPruned
+        m['depth'] = len(self._path)
+        m['valueIncreasePerSecond'] = \
+            abs(self._bestSol[1] - self._firstSol[1]) / \
+            float(time.time() - self._startTime)
+        return super(BranchAndBound, self).measure(
+            lastMeasure=lastMeasure, m=m)
+
+    def _done(self):
+        self._log(
+            'Done. Optimum: %s [%.3f] (%d nodes, %d pruned)'
+            % (str(self._bestSol[0]), self._bestSol[1], self._nbNodes,
+               self._nbPruned), force=True, level=4)
+        print "Branch and Bound optimizing task performed in %.3fs" \
+            % (time.time() - self._start_t)
+        raise OptimizationSolution(*self._bestSol)
+
+    def step(self):
+        """
+        Visualization data exchange protocol: same as the `BruteForce`
+        optimizer, the `current` field holds the last partial solution
+        explored, where the components not placed yet are set to None.
+        """
+        size = len(self._scope)
+        for n in xrange(NODES_PER_STEP):
+            # the best solution can't be better than the lower bound
+            if not self._candidates or self._bestSol[1] <= self._rootBound:
+                self._done()
+            k = len(self._candidates) - 1
+            del self._path[k:]
+            del self._costs[k:]
+            candidates = self._candidates[-1]
+            # the best solution may have been improved since the candidates
+            # have been bounded
+            while candidates and candidates[-1][0] >= self._bestSol[1]:
+                candidates.pop()
+                self._nbPruned += 1
+            if not candidates:
+                self._candidates.pop()
+                continue
+            bound, position, cost = candidates.pop()
+            self._path.append(position)
+            self._costs.append(cost)
+            if k + 1 < size:
+                self._candidates.append(self._expand(k + 1))
+            elif cost < self._bestSol[1]:
+                self._bestSol = (self._values[self._path].tolist(), cost)
+                self._log('>>> [%.3f] %s is better!'
+                          % (cost, str(self._bestSol[0])),
+                          timeout=0.01, level=3)
+
+        current = self._values[self._path].tolist() + \
+            [None] * (size - len(self._path))
+        self._viz({
+            'current': {'solution': current,
+                        'evaluation': self._costs[-1]
+                        if self._costs else None},
+            'best': {'solution': self._bestSol[0],
+                     'evaluation': self._bestSol[1]}
+        })
@@ -2,9 +2,46 @@
 
 from __future__ import unicode_literals
 
+from multiprocessing import Pool, cpu_count
+import itertools
+import math
+import signal
 import time
 
+import numpy as np
+
 from optimizer import Optimizer, OptimizationSolution
+from tools import utils
+from tools.searchSpace import GridSpace
+
+# number of solutions evaluated at once
+CHUNK_SIZE = 1024
+
+# solver instance used by the worker processes of a parallel run.
+# Workers are forked from the solver process, so the instance (and the problem
+# it solves) is inherited rather than pickled.
+_worker = None
+
+
+def _initWorker(solver):
+    global _worker
+    _worker = solver
+
+
+def _runTask(task):
+    """
+    Run one task of a parallel run in a worker process. Returns the task
+    along with its result.
+    """
+    return task, _worker._runTask(task)
+
+
+def _terminate(signum, frame):
+    """
+    Turns the SIGTERM signal into a `SystemExit` exception, so that the
+    worker processes are terminated along with the solver process.
+    """
+    raise SystemExit()
 
 
 class BruteForce(Optimizer):
@@ -15,93 +52,392 @@ class BruteForce(Optimizer):
     * `step`, float value, speed of search for the solution over the search
       space. Higher values will increase the speed, but lower the precision
       of solution found.
+    * `processes`, int value, number of processes the search space is shared
+      between. Set to 0 to use all the cores of the machine, and to 1 (the
+      default) to run the search step by step in the solver process.
+    * `symmetry`, int value, set to 1 (the default) to skip the solutions
+      that are symmetric copies of another one, when the problem has
+      symmetries. Only the canonical solution of each set of copies is
+      evaluated, which still finds the best evaluation. Set to 0 to evaluate
+      all the solutions.
+    * `coarseStep`, float value, enables the multi-resolution search when
+      greater than `step`: the grid of step `coarseStep` (rounded to `step`
+      times a power of two, so that all the levels share the grid of step
+      `step`) is evaluated first, then the step is halved, and only the grid points around the `topK`
+      best solutions of the previous level are evaluated, until the step
+      reaches `step`. This is much faster than evaluating the whole grid of
+      step `step`, but the best solution is not guaranteed to be found
+      anymore. Set to 0 (the default) to evaluate the whole grid. The
+      multi-resolution search runs in a single process.
+    * `topK`, int value, number of solutions refined at each level of the
+      multi-resolution search.
     """
-    def __init__(self, name, problem, step=1.0):
+    def __init__(self, name, problem, step=1.0, processes=1, symmetry=1,
+                 coarseStep=0, topK=10):
         super(BruteForce, self).__init__(name=name, problem=problem)
         self._step = float(step)
+        self._processes = int(processes) or cpu_count()
+        # successive steps of the multi-resolution search
+        self._steps = []
+        if float(coarseStep) > self._step:
+            levels = int(round(math.log(float(coarseStep) / self._step, 2)))
+            self._steps = [self._step * 2 ** k
+                           for k in reversed(xrange(levels + 1))]
+        if len(self._steps) > 1:
+            self._processes = 1
+        else:
+            self._steps = []
+        self._topK = int(topK)
+        # best solutions of the current level of the multi-resolution search
+        self._topSolutions = None
+        self._topEvaluations = None
+        self._level = 0
+        self._symmetry = bool(int(symmetry)) and \
+            len(problem.symmetries()) > 1
+        # number of solutions skipped because of the symmetries
+        self._skipped = 0
         self._bestSol = None
+        # index in the search space of the best solution
+        self._bestIndex = None
         self._firstSol = None
-        self._solGenerator = self._genNext()
+        self._evaluated = 0
+        # number of solutions evaluated before resuming the run
+        self._resumedAt = 0
+        # index of the first solution that has not been evaluated (all the
+        # solutions before this one have been)
+        self._position = 0
+        # the grid over which the solutions are searched
+        self._space = GridSpace(self._scope, self._step)
+        self._size = self._space.getSize()
+        # range of indices `[start, stop)` of the search space to explore
+        self._start = 0
+        self._stop = self._size
+        self._chunks = self._genRefinedChunks() if self._steps \
+            else self._genChunks()
         print "Starting Bruteforce optimizer."
 
-    def _genNext(self):
-        """
-        Generate the next solution to try out.
-        """
-        def inc(solution, i=0):
-            """
-            Increment the solution's value at position i.
-            * solution:list, last generated solution
-            * i:int, the index of the variable to increment
-            """
-            done = False
-            if i >= len(solution):
-                return True
-            if solution[i] + self._step > self._scope[i][2]:
-                done = inc(solution, i + 1)
-                solution[i] = self._scope[i][1]
-            else:
-                solution[i] += self._step
-            return done
-
-        # solution = [min, min, min, ...]
-        solution = [var[0](var[1]) for var in self._scope]
-        done = False
-        while not done:
-            yield solution
-            done = inc(solution)
+    def _genChunks(self, start=0, stop=None):
+        """
+        Generate the next solutions to try out, as 2D arrays of `CHUNK_SIZE`
+        solutions (one per row).
+        * start:int, index in the search space of the first solution
+        * stop:int, index of the solution to stop at (excluded). The whole
+          search space is generated by default.
+        """
+        return self._space.genChunks(start, stop, CHUNK_SIZE)
+
+    def _genRefinedChunks(self):
+        """
+        Generate the solutions of the multi-resolution search, by chunks of
+        `CHUNK_SIZE` solutions: the whole coarse grid first, then, for each
+        finer step, the grid points around the best solutions evaluated at
+        the previous level. Each variable of these solutions is moved by
+        -step, 0 or +step, which splits the cell of each solution in the
+        grid of the previous level.
+        """
+        dimension = len(self._scope)
+        coarse = GridSpace(self._scope, self._steps[0])
+        neighborhood = 3 ** dimension
+        # the exact number of solutions of the next levels is known once
+        # their grid points have been computed
+        self._stop = coarse.getSize() + \
+            (len(self._steps) - 1) * self._topK * neighborhood
+        for chunk in coarse.genChunks(chunkSize=CHUNK_SIZE):
+            yield chunk
+        offsets = np.array(list(
+            itertools.product([-1, 0, 1], repeat=dimension)))
+        mins = np.array([var[1] for var in self._scope], dtype=float)
+        low = mins - 1e-9
+        high = np.array([var[2] for var in self._scope]) + 1e-9
+        for level, step in enumerate(self._steps[1:]):
+            self._level = level + 1
+            centers = self._topSolutions
+            self._topSolutions = self._topEvaluations = None
+            if centers is None:
+                # no solution has been kept at the previous level (all of
+                # them were skipped): nothing left to refine
+                self._stop = self._evaluated
+                return
+            solutions = (centers[:, None, :] + offsets[None, :, :] * step)\
+                .reshape(-1, dimension)
+            # stay on the grid of step `step`, despite the rounding errors
+            solutions = mins + np.round(
+                (solutions - mins) / self._step) * self._step
+            solutions = solutions[
+                ((solutions >= low) & (solutions <= high)).all(axis=1)]
+            # remove the points shared by the neighborhoods of two solutions
+            solutions = solutions[np.lexsort(solutions.T[::-1])]
+            unique = np.ones(len(solutions), dtype=bool)
+            unique[1:] = (solutions[1:] != solutions[:-1]).any(axis=1)
+            solutions = solutions[unique]
+            self._stop = self._evaluated + len(solutions) + \
+                (len(self._steps) - self._level - 1) * self._topK * \
+                neighborhood
+            for start in xrange(0, len(solutions), CHUNK_SIZE):
+                yield solutions[start:start + CHUNK_SIZE]
+
+    def _keepTop(self, solutions, evaluations):
+        """
+        Keep the `topK` best of the given solutions and of the ones kept so
+        far for the current level of the multi-resolution search.
+        """
+        if self._topSolutions is not None:
+            solutions = np.concatenate((self._topSolutions, solutions))
+            evaluations = np.concatenate((self._topEvaluations, evaluations))
+        top = np.argsort(evaluations * self._orientation,
+                         kind='mergesort')[:self._topK]
+        self._topSolutions = solutions[top]
+        self._topEvaluations = evaluations[top]
+
+    def _evaluateChunk(self, chunk):
+        """
+        Evaluate all the solutions of the given chunk at once. Returns the
+        first best solution of the chunk and the first solution, along with
+        their evaluation, the position of the best solution in the chunk and
+        the number of solutions skipped because of the symmetries. The
+        solutions are None if all of them have been skipped.
+        """
+        if self._symmetry:
+            positions = np.flatnonzero(self._problem.canonicalMask(chunk))
+            if not len(positions):
+                return None, None, None, len(chunk)
+        else:
+            positions = np.arange(len(chunk))
+        evaluations = self._problem.evaluateBatch(chunk[positions])
+        if self._steps:
+            self._keepTop(chunk[positions], evaluations)
+        best = int(np.argmin(evaluations * self._orientation))
+        return (chunk[positions[best]].tolist(), evaluations[best]), \
+            (chunk[positions[0]].tolist(), evaluations[0]), \
+            int(positions[best]), len(chunk) - len(positions)
+
+    def _merge(self, candidate, index):
+        """
+        Keep the given candidate solution (found at `index` in the search
+        space) if it is better than the best solution found so far. On equal
+        evaluations, the solution that comes first in the search space is kept,
+        whatever the order in which the solutions have been evaluated.
+        """
+        if self._bestSol is None or self._problem.isBetter(
+                candidate[1], self._bestSol[1]) or (
+                not self._problem.isBetter(self._bestSol[1], candidate[1])
+                and index < self._bestIndex):
+            if self._bestSol is None or candidate[1] != self._bestSol[1]:
+                self._log(
+                    '>>> [%.3f] %s is better!'
+                    % (candidate[1], str(candidate[0])),
+                    timeout=0.01, level=3)
+            self._bestSol = candidate
+            self._bestIndex = index
+
+    def _genTasks(self):
+        """
+        Split the search space into tasks for a parallel run. A task is a
+        tuple that starts with the range of indices `(start, stop)` of the
+        search space it covers.
+        """
+        # tasks are aligned on the chunks, so that the solutions are evaluated
+        # exactly as with a single process.
+        taskSize = utils.clamp(
+            (self._stop - self._start) // (self._processes * 16),
+            CHUNK_SIZE, 64 * CHUNK_SIZE)
+        taskSize = -(-taskSize // CHUNK_SIZE) * CHUNK_SIZE
+        start = self._position
+        while start < self._stop:
+            yield (start, min(start + taskSize, self._stop))
+            start += taskSize
+
+    def _genTaskChunks(self, task):
+        """
+        Generate the solutions of the given task, by chunks.
+        """
+        return self._genChunks(task[0], task[1])
+
+    def _runTask(self, task):
+        """
+        Evaluate all the solutions of the given task, in a worker process.
+        Returns the best solution and evaluation found and its index in the
+        search space, the first solution and evaluation, the number of
+        solutions of the task and the number of them that have been skipped
+        because of the symmetries.
+        """
+        best = first = bestIndex = None
+        count = skipped = 0
+        for chunk in self._genTaskChunks(task):
+            chunkBest, chunkFirst, offset, chunkSkipped = \
+                self._evaluateChunk(chunk)
+            if chunkBest is not None and (best is None or self._problem
+                                          .isBetter(chunkBest[1], best[1])):
+                best = chunkBest
+                bestIndex = task[0] + count + offset
+            if first is None:
+                first = chunkFirst
+            count += len(chunk)
+            skipped += chunkSkipped
+        return best, bestIndex, first, count, skipped
+
+    def getCheckpoint(self):
+        # the multi-resolution search can't be resumed
+        if self._bestSol is None or self._steps:
+            return None
+        return {
+            'position': self._position,
+            'best': self._bestSol,
+            'bestIndex': self._bestIndex,
+            'first': self._firstSol,
+            'steps': self._nbSteps
+        }
+
+    def restoreCheckpoint(self, state):
+        self._position = state['position']
+        self._evaluated = self._resumedAt = state['position'] - self._start
+        self._bestSol = tuple(state['best'])
+        self._bestIndex = state['bestIndex']
+        self._firstSol = tuple(state['first'])
+        self._nbSteps = state['steps']
+        self._chunks = self._genChunks(self._position, self._stop)
 
     def measure(self, lastMeasure=None, m=None):
         if m is None:
             m = {}
-        m['best'] = self._bestSol[1]
-        m['valueIncreasePerSecond'] = \
-            abs(self._bestSol[1] - self._firstSol[1]) / \
-            float(time.time() - self._startTime)
+        if self._bestSol is not None:
+            m['best'] = self._bestSol[1]
+        m['evaluations'] = self._evaluated
+        if self._symmetry:
+            m['skipped'] = self._skipped
+        if self._steps:
+            m['level'] = self._level
+            # evaluations saved compared to the whole grid
+            m['saved'] = self._size - self._evaluated
+        m['total'] = self._stop - self._start
+        m['progress'] = 100.0 * self._evaluated / m['total']
+        # estimated remaining time, in seconds
+        if self._evaluated > self._resumedAt:
+            m['eta'] = (time.time() - self._startTime) * \
+                (m['total'] - self._evaluated) / \
+                float(self._evaluated - self._resumedAt)
+        if self._firstSol is not None and self._bestSol is not None:
+            m['valueIncreasePerSecond'] = \
+                abs(self._bestSol[1] - self._firstSol[1]) / \
+                float(time.time() - self._startTime)
         return super(BruteForce, self).measure(lastMeasure=lastMeasure, m=m)
 
+    def solve(self):
+        """
+        Step by step implementation when using a single process, otherwise
+        the tasks are dispatched to a pool of worker processes and the best
+        solution of each task is merged as soon as it is available. On equal
+        evaluations, the solution that comes first in the search space is kept
+        so that the result is the same as with a single process.
+        """
+        if self._processes == 1:
+            return super(BruteForce, self).solve()
+
+        self._log('Searching over %d processes.' % self._processes,
+                  force=True, level=2)
+        pool = Pool(self._processes, initializer=_initWorker,
+                    initargs=(self,))
+        signal.signal(signal.SIGTERM, _terminate)
+        try:
+            # tasks completed after a task that is still running
+            completed = {}
+            measure = None
+            for task, (best, bestIndex, first, count, skipped) in \
+                    pool.imap_unordered(_runTask, self._genTasks()):
+                self._nbSteps += 1
+                self._evaluated += count
+                self._skipped += skipped
+                if task[0] == self._start:
+                    self._firstSol = first
+                if best is None:
+                    best = self._bestSol
+                else:
+                    self._merge(best, bestIndex)
+                completed[task[0]] = task[1]
+                while self._position in completed:
+                    self._position = completed.pop(self._position)
+                if self._bestSol is None:
+                    continue
+                self._log('Evaluated %d/%d solutions'
+                          % (self._evaluated, self._stop - self._start),
+                          level=1)
+                self._viz({
+                    'current': {'solution': best[0], 'evaluation': best[1]},
+                    'best': {'solution': self._bestSol[0],
+                             'evaluation': self._bestSol[1]},
+                    'progress': {'evaluated': self._evaluated,
+                                 'total': self._stop - self._start}
+                })
+                measure = self.measure(lastMeasure=measure)
+                self._flush()
+                self._checkpoint()
+        finally:
+            pool.terminate()
+            pool.join()
+        self._done()
+
+    def _done(self):
+        """
+        Called once the whole search space has been explored. Raise the best
+        solution found.
+        """
+        if self._bestSol is None:
+            # only symmetric copies of solutions out of the explored range
+            raise OptimizationSolution(None, None)
+        self._log(
+            'Done. Best overall: %s [%.3f]'
+            % (str(self._bestSol[0]), self._bestSol[1]), force=True,
+            level=4)
+        print "Bruteforce optimizing task performed in %.3fs" \
+            % (time.time() - self._start_t)
+        raise OptimizationSolution(*self._bestSol)
+
     def step(self):
         """
         Visualization data exchange protocol:
-        Json encoded object having 3 fields: `current` `best` and `done`
+        Json encoded object having 3 fields: `current` `best` and `progress`
         The two first holds an object with the fields `solution` (that contains
         the actual solution) and `evaluation` (that contains the evaluation for
-        this solution).
-        The latter is a boolean indicating if the process is terminated.
+        this solution). `current` is the best solution among the ones evaluated
+        during the last step (or the last task performed, when running over
+        several processes).
+        The latter holds the number of solutions `evaluated` so far and the
+        `total` number of solutions to evaluate.
         """
-        # get the next possible solution. If the generator has finished
+        # get the next possible solutions. If the generator has finished
         # (i.e.: all search space has been explored), then raise the best
         # solution found.
         try:
-            solution = self._solGenerator.next()
+            chunk = self._chunks.next()
         except StopIteration:
-            self._log(
-                'Done. Best overall: %s [%.3f]'
-                % (str(self._bestSol[0]), self._bestSol[1]), force=True,
-                level=4)
-            print "Bruteforce optimizing task performed in %.3fs" \
-                % (time.time() - self._start_t)
-            raise OptimizationSolution(*self._bestSol)
+            self._done()
 
         # if there is a solution to evaluate, do it.
-        evaluation = self._problem.evaluate(solution)
-        # if the evaluated solution is better than the best found
-        # up to this point, save it.
-        if self._bestSol is None or self._problem.isBetter(
-                evaluation, self._bestSol[1]):
-            self._log(
-                '>>> [%.3f] %s is better!' % (evaluation, str(solution)),
-                timeout=0.01, level=3)
-            self._bestSol = (list(solution), evaluation)
+        current, first, offset, skipped = self._evaluateChunk(chunk)
+        self._evaluated += len(chunk)
+        self._skipped += skipped
+        if current is None:
+            # all the solutions of the chunk are symmetric copies
+            self._position += len(chunk)
+            if self._bestSol is None:
+                return False
+            current = self._bestSol
+        else:
+            # if the evaluated solution is better than the best found
+            # up to this point, save it.
+            self._merge(current, self._position + offset)
+            self._position += len(chunk)
         # save the first evaluation for the measurement function
         if self._firstSol is None:
-            self._firstSol = self._bestSol
+            self._firstSol = first
 
         # a bit of logging
         self._log(
-            'Evaluation: %s [%.3f]' % (str(solution), evaluation), level=1)
+            'Evaluation: %s [%.3f]' % (str(current[0]), current[1]), level=1)
         self._viz({
-            'current': {'solution': solution, 'evaluation': evaluation},
+            'current': {'solution': current[0], 'evaluation': current[1]},
             'best': {'solution': self._bestSol[0],
-                     'evaluation': self._bestSol[1]}
+                     'evaluation': self._bestSol[1]},
+            'progress': {'evaluated': self._evaluated,
+                         'total': self._stop - self._start}
         })
@@ -0,0 +1,161 @@
+# -*- coding: utf8 -*-
+
+from __future__ import unicode_literals
+
+import math
+import time
+
+import numpy as np
+
+from optimizer import Optimizer, OptimizationSolution
+
+
+class CmaEs(Optimizer):
+    """
+    Covariance matrix adaptation evolution strategy (CMA-ES), for problems
+    with continuous variables. At each iteration, a population is sampled
+    from a multivariate normal distribution, evaluated at once, and the mean,
+    covariance matrix and step size of the distribution are updated from the
+    best half of the population. The variables are normalized to [0, 1]
+    using the scope of the problem, and the samples are clipped to it.
+    * `population`, int value, number of solutions sampled at each
+      iteration. Set to 0 (the default) to use `4 + 3 * ln(dimension)`.
+    * `iterations`, int value, number of iterations.
+    * `sigma`, float value, initial step size, as a fraction of the range of
+      the variables.
+    """
+    def __init__(self, name, problem, population=0, iterations=500,
+                 sigma=0.3):
+        super(CmaEs, self).__init__(name=name, problem=problem)
+        n = len(self._scope)
+        self._lambda = int(population) or 4 + int(3 * math.log(n))
+        self._iterations = int(iterations)
+        self._sigma = float(sigma)
+        self._low = np.array([var[1] for var in self._scope], dtype=float)
+        self._high = np.array([var[2] for var in self._scope], dtype=float)
+        # selection and recombination
+        self._mu = self._lambda // 2
+        weights = math.log(self._mu + 0.5) - \
+            np.log(np.arange(1, self._mu + 1))
+        self._weights = weights / weights.sum()
+        self._mueff = 1 / (self._weights ** 2).sum()
+        # adaptation of the covariance matrix and of the step size
+        self._cc = (4 + self._mueff / n) / (n + 4 + 2 * self._mueff / n)
+        self._cs = (self._mueff + 2) / (n + self._mueff + 5)
+        self._c1 = 2 / ((n + 1.3) ** 2 + self._mueff)
+        self._cmu = min(1 - self._c1, 2 * (self._mueff - 2 + 1 / self._mueff)
+                        / ((n + 2) ** 2 + self._mueff))
+        self._damps = 1 + 2 * max(
+            0, math.sqrt((self._mueff - 1) / (n + 1)) - 1) + self._cs
+        # expected norm of a N(0, I) vector
+        self._chiN = math.sqrt(n) * (1 - 1.0 / (4 * n) + 1.0 / (21 * n * n))
+        self._mean = None
+        self._pc = np.zeros(n)
+        self._ps = np.zeros(n)
+        self._B = np.eye(n)
+        self._D = np.ones(n)
+        self._C = np.eye(n)
+        self._invsqrtC = np.eye(n)
+        self._solutions = None
+        self._evaluations = None
+        self._bestSol = None
+        self._firstSol = None
+        self._iteration = 0
+        print "Starting CMA-ES optimizer."
+
+    def initialize(self):
+        super(CmaEs, self).initialize()
+        self._mean = np.random.rand(len(self._scope))
+
+    def _sample(self):
+        """
+        Sample a new population (in the normalized space), clipped to the
+        scope of the problem.
+        """
+        z = np.random.randn(self._lambda, len(self._scope))
+        return np.clip(
+            self._mean + self._sigma * (z * self._D).dot(self._B.T), 0, 1)
+
+    def _adapt(self, selected):
+        """
+        Update the distribution from the selected solutions (the best ones
+        first, in the normalized space).
+        """
+        n = len(self._scope)
+        old = self._mean
+        self._mean = self._weights.dot(selected)
+        shift = (self._mean - old) / self._sigma
+        self._ps = (1 - self._cs) * self._ps + math.sqrt(
+            self._cs * (2 - self._cs) * self._mueff) * \
+            self._invsqrtC.dot(shift)
+        hsig = np.linalg.norm(self._ps) / math.sqrt(
+            1 - (1 - self._cs) ** (2 * (self._iteration + 1))) / \
+            self._chiN < 1.4 + 2.0 / (n + 1)
+        self._pc = (1 - self._cc) * self._pc + hsig * math.sqrt(
+            self._cc * (2 - self._cc) * self._mueff) * shift
+        steps = (selected - old) / self._sigma
+        self._C = (1 - self._c1 - self._cmu) * self._C + self._c1 * (
+            np.outer(self._pc, self._pc) +
+            (1 - hsig) * self._cc * (2 - self._cc) * self._C) + \
+            self._cmu * (steps.T * self._weights).dot(steps)
+        self._sigma *= math.exp(
+            self._cs / self._damps *
+            (np.linalg.norm(self._ps) / self._chiN - 1))
+        # decomposition of the covariance matrix: C = B.D^2.B^T
+        self._C = np.triu(self._C) + np.triu(self._C, 1).T
+        eigenvalues, self._B = np.linalg.eigh(self._C)
+        self._D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+        self._invsqrtC = (self._B / self._D).dot(self._B.T)
+
+    def measure(self, lastMeasure=None, m=None):
+        if m is None:
+            m = {}
+        m['best'] = self._bestSol[1]
+        m['mean'] = float(self._evaluations.mean())
+        m['std'] = float(self._evaluations.std())
+        m['sigma'] = self._sigma
+        m['iteration'] = self._iteration
+        m['valueIncreasePerSecond'] = \
+            abs(self._bestSol[1] - self._firstSol[1]) / \
+            float(time.time() - self._startTime)
+        return super(CmaEs, self).measure(lastMeasure=lastMeasure, m=m)
+
+    def step(self):
+        """
+        Visualization data exchange protocol: same as the `BruteForce`
+        optimizer, the `current` field holds the best solution sampled at
+        this iteration.
+        """
+        if self._iteration >= self._iterations:
+            self._log(
+                'Done. Best overall: %s [%.3f]'
+                % (str(self._bestSol[0]), self._bestSol[1]), force=True,
+                level=4)
+            print "CMA-ES optimizing task performed in %.3fs" \
+                % (time.time() - self._start_t)
+            raise OptimizationSolution(*self._bestSol)
+
+        samples = self._sample()
+        self._solutions = self._low + samples * (self._high - self._low)
+        self._evaluations = np.asarray(
+            self._problem.evaluateBatch(self._solutions), dtype=float)
+        order = np.argsort(self._evaluations * self._orientation,
+                           kind='mergesort')
+        current = (self._solutions[order[0]].tolist(),
+                   float(self._evaluations[order[0]]))
+        if self._bestSol is None or self._problem.isBetter(
+                current[1], self._bestSol[1]):
+            self._bestSol = current
+            self._log('>>> [%.3f] %s is better!'
+                      % (current[1], str(current[0])),
+                      timeout=0.01, level=3)
+        if self._firstSol is None:
+            self._firstSol = current
+        self._adapt(samples[order[:self._mu]])
+        self._iteration += 1
+
+        self._viz({
+            'current': {'solution': current[0], 'evaluation': current[1]},
+            'best': {'solution': self._bestSol[0],
+                     'evaluation': self._bestSol[1]}
+        })
@@ -0,0 +1,297 @@
+# -*- coding: utf8 -*-
+
+from __future__ import unicode_literals
+
+from multiprocessing import Pool, cpu_count
+import signal
+import time
+
+import numpy as np
+
+from optimizer import Optimizer, OptimizationSolution
+import bruteForce
+from bruteForce import _initWorker, _terminate
+
+
+def _evaluateTask(task):
+    """
+    Evaluate a part of the population in a worker process. Returns only the
+    evaluations: the solver process already holds the population.
+    """
+    return bruteForce._worker._runTask(task)
+
+
+class GeneticAlgorithm(Optimizer):
+    """
+    Genetic algorithm. The population is kept as a single array (one solution
+    per row), and each generation is evaluated at once. The next generation
+    is made of the best solutions of the current one (elitism) and of
+    children of parents chosen by tournament, built by crossover and then
+    mutated. All these operators work on the whole population at once.
+    When the scope of the problem describes a permutation, the children are
+    permutations as well.
+    * `population`, int value, number of solutions of each generation.
+    * `generations`, int value, number of generations.
+    * `crossover`, the crossover operator. For permutations: 'ox' (ordered
+      crossover, the default) or 'pmx' (partially mapped crossover). For
+      other problems: 'blx' (blend crossover, the default) or 'uniform'.
+    * `mutation`, float value, probability for a child to be mutated (swap of
+      two variables for permutations, gaussian noise on each variable
+      otherwise).
+    * `tournament`, int value, number of solutions competing to be chosen as
+      a parent.
+    * `elite`, int value, number of best solutions kept unchanged in the
+      next generation.
+    * `processes`, int value, number of processes each generation is
+      evaluated over, for problems that can't evaluate many solutions at
+      once efficiently. Set to 0 to use all the cores of the machine, and to
+      1 (the default) to evaluate the generation in the solver process.
+    """
+    def __init__(self, name, problem, population=100, generations=200,
+                 crossover='auto', mutation=0.2, tournament=3, elite=2,
+                 processes=1):
+        super(GeneticAlgorithm, self).__init__(name=name, problem=problem)
+        self._size = int(population)
+        self._generations = int(generations)
+        self._permutation = self._isPermutation()
+        if self._permutation:
+            self._crossover = crossover if crossover == 'pmx' else 'ox'
+        else:
+            self._crossover = crossover if crossover == 'uniform' else 'blx'
+        self._mutation = float(mutation)
+        self._tournament = max(1, int(tournament))
+        self._elite = min(int(elite), self._size)
+        self._processes = int(processes) or cpu_count()
+        self._low = np.array([var[1] for var in self._scope], dtype=float)
+        self._high = np.array([var[2] for var in self._scope], dtype=float)
+        self._integers = np.array([var[0] is int for var in self._scope])
+        self._pool = None
+        self._population = None
+        self._evaluations = None
+        self._bestSol = None
+        self._firstSol = None
+        self._generation = 0
+        self._nbEvaluations = 0
+        self._evaluationTime = 0.0
+        print "Starting Genetic Algorithm optimizer."
+
+    def initialize(self):
+        super(GeneticAlgorithm, self).initialize()
+        if self._processes > 1:
+            self._pool = Pool(self._processes, initializer=_initWorker,
+                              initargs=(self,))
+            signal.signal(signal.SIGTERM, _terminate)
+        if self._permutation:
+            # random permutations: argsort of random keys
+            self._population = np.argsort(
+                np.random.rand(self._size, len(self._scope)), axis=1) + \
+                self._scope[0][1]
+        else:
+            self._population = self._repair(
+                self._low + np.random.rand(self._size, len(self._scope)) *
+                (self._high - self._low))
+        self._evaluate()
+        self._firstSol = self._bestSol
+
+    def _runTask(self, task):
+        """
+        Evaluate a part of the population, in a worker process.
+        """
+        return self._problem.evaluateBatch(task)
+
+    def _evaluate(self):
+        """
+        Evaluate the whole population at once, or split over the worker
+        processes, and update the best solution found.
+        """
+        start = time.time()
+        if self._pool is not None:
+            tasks = np.array_split(self._population, self._processes)
+            self._evaluations = np.concatenate(
+                self._pool.map(_evaluateTask, tasks))
+        else:
+            self._evaluations = np.asarray(
+                self._problem.evaluateBatch(self._population), dtype=float)
+        self._evaluationTime += time.time() - start
+        self._nbEvaluations += len(self._population)
+        best = int(np.argmin(self._evaluations * self._orientation))
+        if self._bestSol is None or self._problem.isBetter(
+                self._evaluations[best], self._bestSol[1]):
+            self._bestSol = (self._population[best].tolist(),
+                             float(self._evaluations[best]))
+            self._log('>>> [%.3f] %s is better!'
+                      % (self._bestSol[1], str(self._bestSol[0])),
+                      timeout=0.01, level=3)
+
+    def _repair(self, solutions):
+        """
+        Clip the given solutions to the scope and round the integer
+        variables.
+        """
+        solutions = np.clip(solutions, self._low, self._high)
+        solutions[:, self._integers] = np.round(
+            solutions[:, self._integers])
+        return solutions
+
+    def _select(self, count):
+        """
+        Returns the indices of `count` parents chosen by tournament: the best
+        of `tournament` random solutions of the population.
+        """
+        candidates = np.random.randint(
+            self._size, size=(count, self._tournament))
+        winners = np.argmin(
+            self._evaluations[candidates] * self._orientation, axis=1)
+        return candidates[np.arange(count), winners]
+
+    def _segments(self, count, size):
+        """
+        Returns the boolean mask (count, size) of random segments `[a, b)`
+        along with their bounds.
+        """
+        cuts = np.sort(np.random.randint(size + 1, size=(count, 2)), axis=1)
+        positions = np.arange(size)
+        segments = (positions >= cuts[:, :1]) & (positions < cuts[:, 1:])
+        return segments, cuts[:, 0], cuts[:, 1]
+
+    def _orderedCrossover(self, parents1, parents2):
+        """
+        Each child takes a segment of its first parent, at the same
+        positions. The other positions are filled, starting after the
+        segment, with the values of the second parent that are not in the
+        segment, in the order they appear after the segment.
+        """
+        count, size = parents1.shape
+        rows = np.arange(count)[:, None]
+        segments, a, b = self._segments(count, size)
+        children = np.where(segments, parents1, -1)
+        inSegment = np.zeros((count, size), dtype=bool)
+        inSegment[np.nonzero(segments)[0], parents1[segments]] = True
+        # positions and values of the second parent, starting after the
+        # segment: both have exactly `size - len(segment)` entries to keep
+        rolled = (np.arange(size) + b[:, None]) % size
+        values = parents2[rows, rolled]
+        positions = rolled[~segments[rows, rolled]]
+        children[np.nonzero(~segments[rows, rolled])[0], positions] = \
+            values[~inSegment[rows, values]]
+        return children
+
+    def _pmxCrossover(self, parents1, parents2):
+        """
+        Each child takes a segment of its first parent and the other values
+        of its second parent. A value of the second parent that is already in
+        the segment is replaced by following the mapping between the values
+        of the two parents in the segment.
+        """
+        count, size = parents1.shape
+        rows = np.arange(count)[:, None]
+        segments, a, b = self._segments(count, size)
+        children = np.where(segments, parents1, parents2)
+        inSegment = np.zeros((count, size), dtype=bool)
+        inSegment[np.nonzero(segments)[0], parents1[segments]] = True
+        # position of each value in the first parent
+        positions = np.empty((count, size), dtype=int)
+        positions[rows, parents1] = np.arange(size)
+        conflicts = inSegment[rows, children] & ~segments
+        while conflicts.any():
+            mapped = parents2[rows, positions[rows, children]]
+            children[conflicts] = mapped[conflicts]
+            conflicts = inSegment[rows, children] & ~segments
+        return children
+
+    def _permutationChildren(self, parents1, parents2):
+        offset = self._scope[0][1]
+        parents1 = parents1.astype(int) - offset
+        parents2 = parents2.astype(int) - offset
+        if self._crossover == 'pmx':
+            children = self._pmxCrossover(parents1, parents2)
+        else:
+            children = self._orderedCrossover(parents1, parents2)
+        # swap mutation
+        mutated = np.flatnonzero(np.random.rand(len(children)) <
+                                 self._mutation)
+        swaps = np.random.randint(children.shape[1], size=(len(mutated), 2))
+        first = children[mutated, swaps[:, 0]]
+        children[mutated, swaps[:, 0]] = children[mutated, swaps[:, 1]]
+        children[mutated, swaps[:, 1]] = first
+        return children + offset
+
+    def _realChildren(self, parents1, parents2):
+        if self._crossover == 'uniform':
+            children = np.where(np.random.rand(*parents1.shape) < 0.5,
+                                parents1, parents2)
+        else:
+            # blend crossover (alpha = 0.5): uniform in the box of the
+            # parents, extended by half its width on each side
+            low = np.minimum(parents1, parents2)
+            width = np.abs(parents1 - parents2)
+            children = low - 0.5 * width + \
+                np.random.rand(*parents1.shape) * 2 * width
+        # gaussian mutation
+        mutated = np.random.rand(len(children)) < self._mutation
+        children[mutated] += np.random.randn(mutated.sum(), len(self._scope)) \
+            * 0.1 * (self._high - self._low)
+        return self._repair(children)
+
+    def _evolve(self):
+        """
+        Replace the population by the next generation, and evaluate it.
+        """
+        order = np.argsort(self._evaluations * self._orientation,
+                           kind='mergesort')
+        count = self._size - self._elite
+        parents1 = self._population[self._select(count)]
+        parents2 = self._population[self._select(count)]
+        if self._permutation:
+            children = self._permutationChildren(parents1, parents2)
+        else:
+            children = self._realChildren(parents1, parents2)
+        self._population = np.concatenate(
+            (self._population[order[:self._elite]],
+             children.astype(self._population.dtype)))
+        self._evaluate()
+        self._generation += 1
+
+    def measure(self, lastMeasure=None, m=None):
+        if m is None:
+            m = {}
+        m['best'] = self._bestSol[1]
+        m['mean'] = float(self._evaluations.mean())
+        m['std'] = float(self._evaluations.std())
+        m['generation'] = self._generation
+        if self._evaluationTime > 0:
+            m['evaluationsPerSecond'] = \
+                self._nbEvaluations / self._evaluationTime
+        m['valueIncreasePerSecond'] = \
+            abs(self._bestSol[1] - self._firstSol[1]) / \
+            float(time.time() - self._startTime)
+        return super(GeneticAlgorithm, self).measure(
+            lastMeasure=lastMeasure, m=m)
+
+    def step(self):
+        """
+        Visualization data exchange protocol: same as the `BruteForce`
+        optimizer, the `current` field holds the best solution of the current
+        generation.
+        """
+        if self._generation >= self._generations:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+            self._log(
+                'Done. Best overall: %s [%.3f]'
+                % (str(self._bestSol[0]), self._bestSol[1]), force=True,
+                level=4)
+            print "Genetic Algorithm optimizing task performed in %.3fs" \
+                % (time.time() - self._start_t)
+            raise OptimizationSolution(*self._bestSol)
+
+        self._evolve()
+
+        best = int(np.argmin(self._evaluations * self._orientation))
+        self._viz({
+            'current': {'solution': self._population[best].tolist(),
+                        'evaluation': float(self._evaluations[best])},
+            'best': {'solution': self._bestSol[0],
+                     'evaluation': self._bestSol[1]}
+        })
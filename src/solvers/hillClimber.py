@@ -0,0 +1,103 @@
+# -*- coding: utf8 -*-
+
+from __future__ import unicode_literals
+
+import time
+
+import numpy as np
+
+from optimizer import Optimizer, OptimizationSolution
+
+
+class HillClimber(Optimizer):
+    """
+    Best-improvement local search. Starting from a random solution, each step
+    applies the swap of two variables that improves the solution the most,
+    until no swap improves it anymore (local optimum). The evaluation change
+    of all the possible swaps is computed by the problem at once, and updated
+    after each move.
+    * `restarts`, int value, number of times the search starts again from a
+      new random solution once a local optimum is reached. The best local
+      optimum found is returned.
+    """
+    def __init__(self, name, problem, restarts=0):
+        super(HillClimber, self).__init__(name=name, problem=problem)
+        self._restarts = int(restarts)
+        self._neighborhood = None
+        self._bestSol = None
+        self._firstSol = None
+        self._nbMoves = 0
+        print "Starting Hill Climber optimizer."
+
+    def _restart(self):
+        """
+        Start a new search from a random solution.
+        """
+        solution = self._randomSolution()
+        self._neighborhood = self._problem.swapNeighborhood(
+            solution, self._problem.evaluate(solution))
+        self._updateBest()
+
+    def _updateBest(self):
+        value = self._neighborhood.getValue()
+        if self._bestSol is None or self._problem.isBetter(
+                value, self._bestSol[1]):
+            self._bestSol = (list(self._neighborhood.getSolution()), value)
+        if self._firstSol is None:
+            self._firstSol = self._bestSol
+
+    def initialize(self):
+        super(HillClimber, self).initialize()
+        self._restart()
+
+    def measure(self, lastMeasure=None, m=None):
+        if m is None:
+            m = {}
+        m['best'] = self._bestSol[1]
+        m['current'] = self._neighborhood.getValue()
+        m['moves'] = self._nbMoves
+        m['valueIncreasePerSecond'] = \
+            abs(self._bestSol[1] - self._firstSol[1]) / \
+            float(time.time() - self._startTime)
+        return super(HillClimber, self).measure(lastMeasure=lastMeasure, m=m)
+
+    def step(self):
+        """
+        Visualization data exchange protocol: same as the `BruteForce`
+        optimizer, the `current` field holds the solution reached after the
+        move performed at this step.
+        """
+        deltas = self._neighborhood.getDeltas()
+        value = self._neighborhood.getValue()
+        # best move, whatever the orientation of the problem
+        i, j = np.unravel_index(
+            np.argmin(deltas * self._orientation), deltas.shape)
+        if not self._problem.isBetter(value + deltas[i, j], value):
+            self._log('Local optimum reached: %s [%.3f]'
+                      % (str(self._neighborhood.getSolution()), value),
+                      force=True, level=3)
+            if self._restarts > 0:
+                self._restarts -= 1
+                self._restart()
+                return
+            self._log(
+                'Done. Best overall: %s [%.3f]'
+                % (str(self._bestSol[0]), self._bestSol[1]), force=True,
+                level=4)
+            print "Hill Climber optimizing task performed in %.3fs" \
+                % (time.time() - self._start_t)
+            raise OptimizationSolution(*self._bestSol)
+
+        self._neighborhood.apply((i, j))
+        self._nbMoves += 1
+        self._updateBest()
+        solution = self._neighborhood.getSolution()
+        value = self._neighborhood.getValue()
+        self._log(
+            'Swapped %d and %d: %s [%.3f]' % (i, j, str(solution), value),
+            level=1)
+        self._viz({
+            'current': {'solution': list(solution), 'evaluation': value},
+            'best': {'solution': self._bestSol[0],
+                     'evaluation': self._bestSol[1]}
+        })
@@ -0,0 +1,215 @@
+# -*- coding: utf8 -*-
+
+from __future__ import unicode_literals
+
+from multiprocessing import Process, Pipe, Queue, cpu_count
+from Queue import Empty
+import random
+import signal
+import time
+
+import numpy as np
+
+from mlbExceptions import SolverException
+from optimizer import OptimizationSolution
+from geneticAlgorithm import GeneticAlgorithm
+from bruteForce import _terminate
+
+# minimum time between two reports of an island to the solver process
+REPORT_INTERVAL = 0.1
+
+
+class IslandModel(GeneticAlgorithm):
+    """
+    Island model of the genetic algorithm: several populations (islands)
+    evolve independently, each in its own process, and regularly send copies
+    of their best solutions (migrants) to the next island, the islands being
+    arranged in a ring. The migrants replace the worst solutions of the
+    island they arrive on. Islands exchange migrants directly, without
+    waiting for each other, and only report their state to the solver
+    process from time to time.
+    * `islands`, int value, number of islands (and processes). Set to 0 (the
+      default) to use one island per core of the machine.
+    * `migrationInterval`, int value, number of generations between two
+      migrations.
+    * `migrants`, int value, number of solutions sent at each migration.
+    The other parameters are the ones of the `GeneticAlgorithm` optimizer,
+    for each island.
+    """
+    def __init__(self, name, problem, islands=0, population=100,
+                 generations=200, crossover='auto', mutation=0.2,
+                 tournament=3, elite=2, migrationInterval=10, migrants=2):
+        super(IslandModel, self).__init__(
+            name=name, problem=problem, population=population,
+            generations=generations, crossover=crossover, mutation=mutation,
+            tournament=tournament, elite=elite, processes=1)
+        self._nbIslands = int(islands) or cpu_count()
+        self._migrationInterval = max(1, int(migrationInterval))
+        self._nbMigrants = min(int(migrants), self._size)
+        # last state reported by each island
+        self._islands = {}
+        print " > Evolving %d islands." % self._nbIslands
+
+    def initialize(self):
+        # the populations are created by the islands
+        super(GeneticAlgorithm, self).initialize()
+
+    def _report(self, results, index, final=False):
+        """
+        Send the state of the island to the solver process.
+        """
+        results.put((index, {
+            'best': self._bestSol,
+            'mean': float(self._evaluations.mean()),
+            'std': float(self._evaluations.std()),
+            'generation': self._generation,
+            'evaluations': self._nbEvaluations,
+            'migrations': self._nbMigrations
+        }, final))
+
+    def _immigrate(self, solutions, evaluations):
+        """
+        Replace the worst solutions of the population by the given ones.
+        """
+        worst = np.argsort(self._evaluations * self._orientation,
+                           kind='mergesort')[::-1][:len(solutions)]
+        self._population[worst] = solutions
+        self._evaluations[worst] = evaluations
+        best = int(np.argmin(evaluations * self._orientation))
+        if self._problem.isBetter(evaluations[best], self._bestSol[1]):
+            self._bestSol = (solutions[best].tolist(),
+                             float(evaluations[best]))
+
+    def _runIsland(self, index, pipes, results):
+        """
+        Evolve the population of the island `index`, in its own process.
+        * pipes:list, the pipes between the islands: the island receives
+          migrants from the pipe `index` and sends its own ones to the pipe
+          `index + 1`.
+        * results:Queue, where the island reports its state.
+        """
+        inbox = pipes[index][0]
+        outbox = pipes[(index + 1) % len(pipes)][1]
+        # close the pipes of the other islands, so that sending migrants to
+        # an island that is done fails instead of blocking
+        for reader, writer in pipes:
+            if reader is not inbox:
+                reader.close()
+            if writer is not outbox:
+                writer.close()
+        # the telemetry channel has a single writer, the solver process: the
+        # improvements found by the island are logged by the solver process
+        # from the reports
+        self._log = self._viz = self._msr = lambda *args, **kwargs: None
+        # each island has its own random sequence
+        np.random.seed()
+        random.seed()
+        self._nbMigrations = 0
+        super(IslandModel, self).initialize()
+        lastReport = time.time()
+        while self._generation < self._generations:
+            self._evolve()
+            try:
+                while inbox is not None and inbox.poll():
+                    self._immigrate(*inbox.recv())
+            except EOFError:
+                # the previous island is done
+                inbox = None
+            if self._generation % self._migrationInterval == 0:
+                best = np.argsort(self._evaluations * self._orientation,
+                                  kind='mergesort')[:self._nbMigrants]
+                try:
+                    outbox.send((self._population[best],
+                                 self._evaluations[best]))
+                    self._nbMigrations += 1
+                except (IOError, EOFError):
+                    pass
+            if time.time() - lastReport > REPORT_INTERVAL:
+                self._report(results, index)
+                lastReport = time.time()
+        self._report(results, index, final=True)
+
+    def measure(self, lastMeasure=None, m=None):
+        if m is None:
+            m = {}
+        islands = self._islands.values()
+        m['best'] = self._bestSol[1]
+        m['mean'] = sum(island['mean'] for island in islands) / len(islands)
+        m['std'] = sum(island['std'] for island in islands) / len(islands)
+        m['generation'] = min(island['generation'] for island in islands)
+        m['migrations'] = sum(island['migrations'] for island in islands)
+        m['evaluationsPerSecond'] = \
+            sum(island['evaluations'] for island in islands) / \
+            float(time.time() - self._startTime)
+        m['valueIncreasePerSecond'] = \
+            abs(self._bestSol[1] - self._firstSol[1]) / \
+            float(time.time() - self._startTime)
+        # skip the measurements of a single population
+        return super(GeneticAlgorithm, self).measure(
+            lastMeasure=lastMeasure, m=m)
+
+    def solve(self):
+        """
+        Start the islands, then merge the states they report as soon as they
+        are available.
+        """
+        results = Queue()
+        pipes = [Pipe(False) for i in xrange(self._nbIslands)]
+        islands = [Process(target=self._runIsland, args=(i, pipes, results))
+                   for i in xrange(self._nbIslands)]
+        for island in islands:
+            island.start()
+        for reader, writer in pipes:
+            reader.close()
+            writer.close()
+        signal.signal(signal.SIGTERM, _terminate)
+        try:
+            running = self._nbIslands
+            measure = None
+            while running:
+                try:
+                    index, state, final = results.get(timeout=1.0)
+                except Empty:
+                    # send the last state kept by _viz and _msr
+                    self._flush()
+                    # an island may have crashed before reporting its end
+                    if any(island.is_alive() for island in islands):
+                        continue
+                    break
+                running -= final
+                self._islands[index] = state
+                current = state['best']
+                if self._bestSol is None or self._problem.isBetter(
+                        current[1], self._bestSol[1]):
+                    self._bestSol = current
+                    self._log('>>> [%.3f] %s is better! (island %d)'
+                              % (current[1], str(current[0]), index),
+                              timeout=0.01, level=3)
+                if self._firstSol is None:
+                    self._firstSol = current
+                self._nbSteps += 1
+                self._viz({
+                    'current': {'solution': current[0],
+                                'evaluation': current[1]},
+                    'best': {'solution': self._bestSol[0],
+                             'evaluation': self._bestSol[1]},
+                    'islands': [self._islands[i]['best'][1]
+                                for i in sorted(self._islands)]
+                })
+                measure = self.measure(lastMeasure=measure)
+                self._flush()
+        finally:
+            for island in islands:
+                island.terminate()
+                island.join()
+        if self._bestSol is None:
+            raise SolverException(
+                'optimizer', self._name, {'islands': self._nbIslands},
+                "All the islands stopped before reporting any solution")
+        self._log(
+            'Done. Best overall: %s [%.3f]'
+            % (str(self._bestSol[0]), self._bestSol[1]), force=True,
+            level=4)
+        print "Island Model optimizing task performed in %.3fs" \
+            % (time.time() - self._start_t)
+        raise OptimizationSolution(*self._bestSol)
@@ -3,6 +3,7 @@
 from __future__ import unicode_literals
 
 import time
+import random
 
 from baseSolver import BaseSolver, Solution
 
@@ -24,3 +25,40 @@ class Optimizer(BaseSolver):
             solverType='optimizer', name=name,
             problem=problem)
         self._scope = problem.getScope()
+        # 1 if lower evaluations are better, -1 otherwise
+        self._orientation = 1 if problem.isBetter(0, 1) else -1
+
+    def measure(self, lastMeasure=None, m=None):
+        """
+        Add the counters of the evaluation cache of the problem, if any, to
+        the measurements.
+        """
+        if m is None:
+            m = {}
+        stats = self._problem.getCacheStats()
+        if stats is not None:
+            m.update(stats)
+        return super(Optimizer, self).measure(lastMeasure=lastMeasure, m=m)
+
+    def _isPermutation(self):
+        """
+        Returns True if the scope of the problem describes a permutation:
+        integer variables that share the same range, as wide as the number of
+        variables.
+        """
+        return all(var[0] is int and var[1:] == self._scope[0][1:]
+                   for var in self._scope) and \
+            self._scope[0][2] - self._scope[0][1] + 1 == len(self._scope)
+
+    def _randomSolution(self):
+        """
+        Returns a random solution within the scope of the problem. If the
+        scope describes a permutation, this is a random permutation.
+        """
+        if self._isPermutation():
+            solution = range(self._scope[0][1], self._scope[0][2] + 1)
+            random.shuffle(solution)
+            return solution
+        return [random.randint(var[1], var[2]) if var[0] is int
+                else var[0](random.uniform(var[1], var[2]))
+                for var in self._scope]
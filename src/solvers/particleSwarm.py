@@ -0,0 +1,128 @@
+# -*- coding: utf8 -*-
+
+from __future__ import unicode_literals
+
+import time
+
+import numpy as np
+
+from optimizer import Optimizer, OptimizationSolution
+
+
+class ParticleSwarm(Optimizer):
+    """
+    Particle swarm optimization, for problems with continuous variables.
+    Each particle moves over the search space with a velocity that is
+    attracted by the best position the particle has found (cognitive part)
+    and by the best position found by the whole swarm (social part). The
+    whole swarm is updated and evaluated at once at each iteration, and the
+    particles are kept within the scope of the problem.
+    * `particles`, int value, number of particles of the swarm.
+    * `iterations`, int value, number of iterations.
+    * `inertia`, float value, fraction of its velocity a particle keeps from
+      an iteration to the next one.
+    * `cognitive`, float value, attraction towards the best position of the
+      particle.
+    * `social`, float value, attraction towards the best position of the
+      swarm.
+    """
+    def __init__(self, name, problem, particles=50, iterations=500,
+                 inertia=0.7298, cognitive=1.49618, social=1.49618):
+        super(ParticleSwarm, self).__init__(name=name, problem=problem)
+        self._nbParticles = int(particles)
+        self._iterations = int(iterations)
+        self._inertia = float(inertia)
+        self._cognitive = float(cognitive)
+        self._social = float(social)
+        self._low = np.array([var[1] for var in self._scope], dtype=float)
+        self._high = np.array([var[2] for var in self._scope], dtype=float)
+        self._positions = None
+        self._velocities = None
+        self._evaluations = None
+        # best position (and its evaluation) found by each particle
+        self._bests = None
+        self._bestEvaluations = None
+        self._bestSol = None
+        self._firstSol = None
+        self._iteration = 0
+        print "Starting Particle Swarm optimizer."
+
+    def initialize(self):
+        super(ParticleSwarm, self).initialize()
+        shape = (self._nbParticles, len(self._scope))
+        width = self._high - self._low
+        self._positions = self._low + np.random.rand(*shape) * width
+        self._velocities = (np.random.rand(*shape) - 0.5) * width
+        self._evaluate()
+        self._bests = self._positions.copy()
+        self._bestEvaluations = self._evaluations.copy()
+        self._firstSol = self._bestSol
+
+    def _evaluate(self):
+        """
+        Evaluate the whole swarm, and update the best solution found.
+        """
+        self._evaluations = np.asarray(
+            self._problem.evaluateBatch(self._positions), dtype=float)
+        best = int(np.argmin(self._evaluations * self._orientation))
+        if self._bestSol is None or self._problem.isBetter(
+                self._evaluations[best], self._bestSol[1]):
+            self._bestSol = (self._positions[best].tolist(),
+                             float(self._evaluations[best]))
+            self._log('>>> [%.3f] %s is better!'
+                      % (self._bestSol[1], str(self._bestSol[0])),
+                      timeout=0.01, level=3)
+
+    def measure(self, lastMeasure=None, m=None):
+        if m is None:
+            m = {}
+        m['best'] = self._bestSol[1]
+        m['mean'] = float(self._evaluations.mean())
+        m['std'] = float(self._evaluations.std())
+        m['iteration'] = self._iteration
+        m['valueIncreasePerSecond'] = \
+            abs(self._bestSol[1] - self._firstSol[1]) / \
+            float(time.time() - self._startTime)
+        return super(ParticleSwarm, self).measure(
+            lastMeasure=lastMeasure, m=m)
+
+    def step(self):
+        """
+        Visualization data exchange protocol: same as the `BruteForce`
+        optimizer, the `current` field holds the best position of the swarm
+        at this iteration.
+        """
+        if self._iteration >= self._iterations:
+            self._log(
+                'Done. Best overall: %s [%.3f]'
+                % (str(self._bestSol[0]), self._bestSol[1]), force=True,
+                level=4)
+            print "Particle Swarm optimizing task performed in %.3fs" \
+                % (time.time() - self._start_t)
+            raise OptimizationSolution(*self._bestSol)
+
+        shape = self._positions.shape
+        self._velocities = self._inertia * self._velocities + \
+            self._cognitive * np.random.rand(*shape) * \
+            (self._bests - self._positions) + \
+            self._social * np.random.rand(*shape) * \
+            (np.array(self._bestSol[0]) - self._positions)
+        self._positions = np.clip(self._positions + self._velocities,
+                                  self._low, self._high)
+        # particles stopped by the bounds lose their velocity
+        self._velocities[(self._positions == self._low) |
+                         (self._positions == self._high)] = 0
+        self._evaluate()
+        improved = self._evaluations * self._orientation < \
+            self._bestEvaluations * self._orientation
+        self._bests[improved] = self._positions[improved]
+        self._bestEvaluations[improved] = self._evaluations[improved]
+        self._iteration += 1
+
+        best = int(np.argmin(self._evaluations * self._orientation))
+        self._viz({
+            'current': {'solution': self._positions[best].tolist(),
+                        'evaluation': float(self._evaluations[best])},
+            'best': {'solution': self._bestSol[0],
+                     'evaluation': self._bestSol[1]}
+        })
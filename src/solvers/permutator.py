@@ -3,10 +3,18 @@
 from __future__ import unicode_literals
 
 import time
-import itertools
 
 from optimizer import OptimizationSolution
 from bruteForce import BruteForce
+from tools import utils
+from tools.searchSpace import PermutationSpace
+
+
+def nbPermutations(n, r):
+    """
+    Returns the number of permutations of `r` values among `n`.
+    """
+    return reduce(lambda a, b: a * b, xrange(n - r + 1, n + 1), 1)
 
 
 class Permutator(BruteForce):
@@ -23,15 +31,58 @@ class Permutator(BruteForce):
     * `step`, int value, speed of search for the solution over the search
       space. Higher values will increase the speed, but lower the precision
       of solution found.
+    * `processes`, int value, number of processes the permutations are
+      shared between. Set to 0 to use all the cores of the machine, and to 1
+      (the default) to run the search step by step in the solver process.
+    * `startRank`, int value, rank (in lexicographic order) of the first
+      permutation to evaluate.
+    * `stopRank`, int value, rank of the permutation to stop at (excluded).
+      Set to 0 (the default) to evaluate the permutations up to the last one.
+      Along with `startRank`, this allows to share a search between several
+      machines.
+    * `symmetry`, int value, set to 1 (the default) to skip the permutations
+      that are symmetric copies of another one, when the problem has
+      symmetries. Set to 0 to evaluate all the permutations.
     """
-    def __init__(self, name, problem, step=1):
+    def __init__(self, name, problem, step=1, processes=1, startRank=0,
+                 stopRank=0, symmetry=1):
         super(Permutator, self).__init__(
-            name=name, problem=problem, step=step)
+            name=name, problem=problem, step=step, processes=processes,
+            symmetry=symmetry)
+        nbValues = len(self._values())
+        self._space = PermutationSpace(self._values(), len(self._scope))
+        self._size = self._space.getSize()
+        last = self._size
+        if self._symmetry:
+            # the first value of a canonical permutation is smaller than the
+            # values of all the variables the first one is mapped to by the
+            # symmetries, so the permutations that start with one of the
+            # largest values are never canonical.
+            images = len(set(int(g[0]) for g in problem.symmetries()))
+            last = (nbValues - images + 1) * \
+                nbPermutations(nbValues - 1, len(self._scope) - 1)
+        self._start = utils.clamp(int(startRank), 0, last)
+        self._stop = utils.clamp(int(stopRank) or last, self._start, last)
+        self._position = self._start
+        self._chunks = self._genChunks(self._start, self._stop)
+        # when running over several processes, the permutations are split
+        # by prefix: the length of the prefixes is chosen so that there are
+        # many more prefixes than processes, so that a process that is done
+        # with a prefix can take the next one while the others are still
+        # working.
+        self._prefixLength = 1
+        while self._prefixLength < len(self._scope) and nbPermutations(
+                nbValues, self._prefixLength) < self._processes * 16:
+            self._prefixLength += 1
+        # number of permutations that start with the same prefix
+        self._blockSize = nbPermutations(
+            nbValues - self._prefixLength,
+            len(self._scope) - self._prefixLength)
         print " > Testing permutations only."
 
-    def _genNext(self):
+    def _values(self):
         """
-        Generates the next solution to try out.
+        Returns the values permuted by this optimizer.
         """
         rng = [None, None, int(self._step)]
         for var in self._scope:
@@ -41,6 +92,17 @@ class Permutator(BruteForce):
                 rng[1] = var[2]
         if (rng[1] - rng[0]) / self._step < len(self._scope):
             rng[1] = rng[0] + len(self._scope) * self._step
-        for solution in itertools.permutations(
-                range(*[int(x) for x in rng]), r=len(self._scope)):
-            yield solution
+        return range(*[int(x) for x in rng])
+
+    def _genTasks(self):
+        """
+        A task is made of all the permutations that start with a given prefix:
+        `(start, stop)` are the ranks of the first and last (excluded)
+        permutations of the prefix, restricted to the permutations left to
+        evaluate.
+        """
+        start = self._position - self._position % self._blockSize
+        while start < self._stop:
+            yield (max(start, self._position),
+                   min(start + self._blockSize, self._stop))
+            start += self._blockSize
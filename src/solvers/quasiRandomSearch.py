@@ -0,0 +1,209 @@
+# -*- coding: utf8 -*-
+
+from __future__ import unicode_literals
+
+import time
+
+import numpy as np
+
+from optimizer import Optimizer, OptimizationSolution
+
+# number of bits of the Sobol sequence
+SOBOL_BITS = 32
+
+# direction numbers of the Sobol sequence (Joe & Kuo), for the dimensions 2
+# and above: degree `s` and coefficients `a` of the primitive polynomial, and
+# initial direction numbers `m`. The first dimension is the van der Corput
+# sequence.
+SOBOL_DIRECTIONS = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]),
+    (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]),
+    (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]),
+    (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]),
+    (6, 19, [1, 1, 1, 15, 7, 5]),
+    (6, 22, [1, 3, 1, 15, 13, 25]),
+    (6, 25, [1, 1, 5, 5, 19, 61]),
+    (7, 1, [1, 3, 7, 11, 23, 15, 103]),
+    (7, 4, [1, 3, 7, 13, 13, 15, 69]),
+]
+
+
+def primes(count):
+    """
+    Returns the first `count` prime numbers.
+    """
+    found = []
+    candidate = 2
+    while len(found) < count:
+        if all(candidate % prime for prime in found
+               if prime * prime <= candidate):
+            found.append(candidate)
+        candidate += 1
+    return found
+
+
+def sobolDirections(dimension):
+    """
+    Returns the direction numbers of the Sobol sequence, as an int array of
+    shape (dimension, SOBOL_BITS).
+    """
+    directions = np.zeros((dimension, SOBOL_BITS), dtype=np.uint64)
+    for d in xrange(dimension):
+        if d == 0:
+            m = [1] * SOBOL_BITS
+        else:
+            s, a, m = SOBOL_DIRECTIONS[d - 1]
+            m = list(m)
+            for k in xrange(s, SOBOL_BITS):
+                value = m[k - s] ^ (m[k - s] << s)
+                for i in xrange(1, s):
+                    value ^= ((a >> (s - 1 - i)) & 1) * m[k - i] << i
+                m.append(value)
+        for k in xrange(SOBOL_BITS):
+            directions[d, k] = m[k] << (SOBOL_BITS - 1 - k)
+    return directions
+
+
+class QuasiRandomSearch(Optimizer):
+    """
+    Random search using a low-discrepancy sequence: the solutions are spread
+    more evenly over the search space than with independent random draws.
+    The solutions are drawn and evaluated by batches.
+    * `sequence`: 'sobol' (the default, for up to 21 variables), 'halton'
+      or 'random' (independent uniform draws). Problems with more variables
+      than supported by the Sobol sequence use the Halton sequence.
+    * `budget`, int value, total number of solutions evaluated.
+    * `batchSize`, int value, number of solutions evaluated at once.
+    * `seed`, int value, seed of the random shift applied to the sequence
+      (or of the random draws): two runs with the same seed evaluate the
+      same solutions.
+    """
+    def __init__(self, name, problem, sequence='sobol', budget=100000,
+                 batchSize=4096, seed=0):
+        super(QuasiRandomSearch, self).__init__(name=name, problem=problem)
+        dimension = len(self._scope)
+        self._sequence = sequence if sequence in ['halton', 'random'] \
+            else 'sobol'
+        if self._sequence == 'sobol' and \
+                dimension > len(SOBOL_DIRECTIONS) + 1:
+            self._sequence = 'halton'
+        self._budget = int(budget)
+        self._batchSize = int(batchSize)
+        self._random = np.random.RandomState(int(seed))
+        self._low = np.array([var[1] for var in self._scope], dtype=float)
+        self._high = np.array([var[2] for var in self._scope], dtype=float)
+        self._integers = np.array([var[0] is int for var in self._scope])
+        if self._sequence == 'sobol':
+            self._directions = sobolDirections(dimension)
+            # random digital shift
+            self._shift = self._random.randint(
+                0, 2 ** 31, size=dimension).astype(np.uint64) << 1
+        elif self._sequence == 'halton':
+            self._bases = primes(dimension)
+            self._shift = self._random.rand(dimension)
+        self._evaluated = 0
+        self._evaluations = None
+        self._bestSol = None
+        self._firstSol = None
+        print "Starting Quasi-Random Search optimizer."
+
+    def _sobol(self, indices):
+        points = np.zeros((len(indices), len(self._scope)), dtype=np.uint64)
+        indices = indices.astype(np.uint64)
+        for k in xrange(SOBOL_BITS):
+            bits = (indices >> np.uint64(k)) & np.uint64(1)
+            points ^= bits[:, None] * self._directions[:, k]
+        return (points ^ self._shift) / float(2 ** SOBOL_BITS)
+
+    def _halton(self, indices):
+        points = np.empty((len(indices), len(self._scope)))
+        for d, base in enumerate(self._bases):
+            # radical inverse of the indices in the given base
+            remaining = indices.copy()
+            value = np.zeros(len(indices))
+            scale = 1.0 / base
+            while remaining.any():
+                remaining, digit = np.divmod(remaining, base)
+                value += digit * scale
+                scale /= base
+            points[:, d] = value
+        return (points + self._shift) % 1.0
+
+    def _draw(self, count):
+        """
+        Returns the next `count` points of the sequence, in [0, 1).
+        """
+        indices = np.arange(self._evaluated, self._evaluated + count)
+        if self._sequence == 'sobol':
+            return self._sobol(indices)
+        if self._sequence == 'halton':
+            return self._halton(indices + 1)
+        return self._random.rand(count, len(self._scope))
+
+    def measure(self, lastMeasure=None, m=None):
+        if m is None:
+            m = {}
+        m['best'] = self._bestSol[1]
+        m['mean'] = float(self._evaluations.mean())
+        m['std'] = float(self._evaluations.std())
+        m['evaluations'] = self._evaluated
+        m['valueIncreasePerSecond'] = \
+            abs(self._bestSol[1] - self._firstSol[1]) / \
+            float(time.time() - self._startTime)
+        return super(QuasiRandomSearch, self).measure(
+            lastMeasure=lastMeasure, m=m)
+
+    def step(self):
+        """
+        Visualization data exchange protocol: same as the `BruteForce`
+        optimizer, the `current` field holds the best solution of the batch
+        evaluated at this step.
+        """
+        count = min(self._batchSize, self._budget - self._evaluated)
+        if count <= 0:
+            self._log(
+                'Done. Best overall: %s [%.3f]'
+                % (str(self._bestSol[0]), self._bestSol[1]), force=True,
+                level=4)
+            print "Quasi-Random Search optimizing task performed in %.3fs" \
+                % (time.time() - self._start_t)
+            raise OptimizationSolution(*self._bestSol)
+
+        points = self._draw(count)
+        # integer variables take each of their values with the same
+        # probability
+        solutions = self._low + points * (
+            self._high - self._low + self._integers)
+        solutions[:, self._integers] = np.minimum(
+            np.floor(solutions[:, self._integers]),
+            self._high[self._integers])
+        self._evaluations = np.asarray(
+            self._problem.evaluateBatch(solutions), dtype=float)
+        self._evaluated += count
+        best = int(np.argmin(self._evaluations * self._orientation))
+        current = (solutions[best].tolist(), float(self._evaluations[best]))
+        if self._bestSol is None or self._problem.isBetter(
+                current[1], self._bestSol[1]):
+            self._bestSol = current
+            self._log('>>> [%.3f] %s is better!'
+                      % (current[1], str(current[0])),
+                      timeout=0.01, level=3)
+        if self._firstSol is None:
+            self._firstSol = current
+
+        self._viz({
+            'current': {'solution': current[0], 'evaluation': current[1]},
+            'best': {'solution': self._bestSol[0],
+                     'evaluation': self._bestSol[1]}
+        })
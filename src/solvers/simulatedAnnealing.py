@@ -0,0 +1,165 @@
+# -*- coding: utf8 -*-
+
+from __future__ import unicode_literals
+
+import math
+import random
+import time
+
+from optimizer import Optimizer, OptimizationSolution
+
+# number of moves tried at each step
+MOVES_PER_STEP = 500
+
+
+class SimulatedAnnealing(Optimizer):
+    """
+    Simulated annealing. Starting from a random solution, each move slightly
+    changes the current solution. Moves that improve the solution are always
+    accepted, the other ones are accepted with a probability that decreases
+    with how much worse they are and with the temperature, which is lowered
+    over time (cooling).
+    When the scope of the problem describes a permutation, a move swaps the
+    values of two variables and is evaluated using the `evaluateDelta`
+    function of the problem. Otherwise, a gaussian noise is added to every
+    variable.
+    * `iterations`, int value, total number of moves tried.
+    * `temperature`, float value, initial temperature. Set to 0 (the default)
+      to choose it so that most of the moves are accepted at the beginning.
+    * `cooling`, the cooling schedule: 'geometric' (the default), where the
+      temperature decreases exponentially down to a thousandth of its initial
+      value, 'linear', down to 0, or 'logarithmic', which is much slower.
+    * `sigma`, float value, standard deviation of the gaussian noise, as a
+      fraction of the range of each variable (not used for permutations).
+    """
+    def __init__(self, name, problem, iterations=100000, temperature=0,
+                 cooling='geometric', sigma=0.05):
+        super(SimulatedAnnealing, self).__init__(name=name, problem=problem)
+        self._iterations = int(iterations)
+        self._initialTemperature = float(temperature)
+        self._temperature = self._initialTemperature
+        self._cooling = cooling if cooling in ['linear', 'logarithmic'] \
+            else 'geometric'
+        self._sigma = float(sigma)
+        self._permutation = self._isPermutation()
+        self._solution = None
+        self._value = None
+        self._bestSol = None
+        self._firstSol = None
+        self._nbMoves = 0
+        self._acceptanceRate = 0
+        print "Starting Simulated Annealing optimizer."
+
+    def initialize(self):
+        super(SimulatedAnnealing, self).initialize()
+        self._solution = self._randomSolution()
+        self._value = self._problem.evaluate(self._solution)
+        self._firstSol = self._bestSol = (list(self._solution), self._value)
+        if self._initialTemperature <= 0:
+            self._initialTemperature = self._estimateTemperature()
+        self._temperature = self._initialTemperature
+
+    def _estimateTemperature(self):
+        """
+        Returns a temperature at which a worsening move of average size is
+        accepted with a probability of 0.8, from a sample of moves around
+        the first solution.
+        """
+        deltas = [(self._tryMove()[1] - self._value) * self._orientation
+                  for i in xrange(100)]
+        deltas = [delta for delta in deltas if delta > 0]
+        if not deltas:
+            return 1.0
+        return -sum(deltas) / len(deltas) / math.log(0.8)
+
+    def _tryMove(self):
+        """
+        Returns a random move from the current solution and the evaluation of
+        the solution it leads to. The move is a pair of variables to swap for
+        permutations, the new solution otherwise.
+        """
+        if self._permutation:
+            move = tuple(random.sample(xrange(len(self._solution)), 2))
+            return move, self._problem.evaluateDelta(
+                self._solution, self._value, move)
+        move = []
+        for value, var in zip(self._solution, self._scope):
+            value = min(var[2], max(var[1], random.gauss(
+                value, self._sigma * (var[2] - var[1]))))
+            move.append(int(round(value)) if var[0] is int else value)
+        return move, self._problem.evaluate(move)
+
+    def _cool(self):
+        """
+        Update the temperature according to the cooling schedule and the
+        number of moves tried.
+        """
+        progress = float(self._nbMoves) / self._iterations
+        if self._cooling == 'linear':
+            self._temperature = self._initialTemperature * (1 - progress)
+        elif self._cooling == 'logarithmic':
+            self._temperature = self._initialTemperature * math.log(2) / \
+                math.log(2 + self._nbMoves)
+        else:
+            self._temperature = self._initialTemperature * 0.001 ** progress
+
+    def measure(self, lastMeasure=None, m=None):
+        if m is None:
+            m = {}
+        m['best'] = self._bestSol[1]
+        m['current'] = self._value
+        m['temperature'] = self._temperature
+        m['acceptanceRate'] = self._acceptanceRate
+        m['moves'] = self._nbMoves
+        m['valueIncreasePerSecond'] = \
+            abs(self._bestSol[1] - self._firstSol[1]) / \
+            float(time.time() - self._startTime)
+        return super(SimulatedAnnealing, self).measure(
+            lastMeasure=lastMeasure, m=m)
+
+    def step(self):
+        """
+        Visualization data exchange protocol: same as the `BruteForce`
+        optimizer, the `current` field holds the current solution of the
+        annealing at the end of the step.
+        """
+        if self._nbMoves >= self._iterations:
+            self._log(
+                'Done. Best overall: %s [%.3f]'
+                % (str(self._bestSol[0]), self._bestSol[1]), force=True,
+                level=4)
+            print "Simulated Annealing optimizing task performed in %.3fs" \
+                % (time.time() - self._start_t)
+            raise OptimizationSolution(*self._bestSol)
+
+        accepted = 0
+        moves = min(MOVES_PER_STEP, self._iterations - self._nbMoves)
+        for i in xrange(moves):
+            move, value = self._tryMove()
+            # positive when the move leads to a worse solution
+            delta = (value - self._value) * self._orientation
+            if delta <= 0 or self._temperature > 0 and \
+                    random.random() < math.exp(-delta / self._temperature):
+                if self._permutation:
+                    i, j = move
+                    self._solution[i], self._solution[j] = \
+                        self._solution[j], self._solution[i]
+                else:
+                    self._solution = move
+                self._value = value
+                accepted += 1
+                if self._problem.isBetter(value, self._bestSol[1]):
+                    self._bestSol = (list(self._solution), value)
+                    self._log('>>> [%.3f] %s is better!'
+                              % (value, str(self._bestSol[0])),
+                              timeout=0.01, level=3)
+            self._nbMoves += 1
+            self._cool()
+        self._acceptanceRate = float(accepted) / moves
+
+        self._viz({
+            'current': {'solution': list(self._solution),
+                        'evaluation': self._value},
+            'best': {'solution': self._bestSol[0],
+                     'evaluation': self._bestSol[1]}
+        })
@@ -0,0 +1,151 @@
+# -*- coding: utf8 -*-
+
+from __future__ import unicode_literals
+
+import time
+
+import numpy as np
+
+from optimizer import Optimizer, OptimizationSolution
+
+
+class TabuList(object):
+    """
+    Fixed-size list of the most recent tabu attributes. The attributes are
+    kept in a ring buffer, to expire the oldest one when a new one is added,
+    along with the number of times each of them is in the buffer, to test
+    whether an attribute is tabu: both are done in constant time.
+    """
+    def __init__(self, tenure):
+        """
+        * tenure:int, number of attributes kept.
+        """
+        super(TabuList, self).__init__()
+        self._buffer = [None] * max(1, tenure)
+        self._next = 0
+        self._counts = {}
+
+    def add(self, attribute):
+        expired = self._buffer[self._next]
+        if expired is not None:
+            self._counts[expired] -= 1
+            if not self._counts[expired]:
+                del self._counts[expired]
+        self._buffer[self._next] = attribute
+        self._counts[attribute] = self._counts.get(attribute, 0) + 1
+        self._next = (self._next + 1) % len(self._buffer)
+
+    def __contains__(self, attribute):
+        return attribute in self._counts
+
+    def __len__(self):
+        return sum(self._counts.values())
+
+
+class TabuSearch(Optimizer):
+    """
+    Tabu search over the swaps of two variables. At each iteration, the best
+    swap is applied, even if it makes the solution worse, unless it is tabu:
+    once a variable has been moved away from a value, moving it back to this
+    value is tabu for the next `tenure` moves, so that the search doesn't
+    cycle around a local optimum. A tabu move is still allowed if it leads
+    to a better solution than the best one found so far (aspiration).
+    The evaluation change of all the possible swaps is computed by the
+    problem at once, and updated after each move.
+    * `iterations`, int value, number of moves.
+    * `tenure`, int value, number of moves an attribute stays tabu. Set to 0
+      (the default) to use the number of variables of the problem.
+    """
+    def __init__(self, name, problem, iterations=10000, tenure=0):
+        super(TabuSearch, self).__init__(name=name, problem=problem)
+        self._iterations = int(iterations)
+        self._tabu = TabuList(int(tenure) or len(self._scope))
+        self._neighborhood = None
+        self._bestSol = None
+        self._firstSol = None
+        self._nbMoves = 0
+        self._nbAspirations = 0
+        print "Starting Tabu Search optimizer."
+
+    def initialize(self):
+        super(TabuSearch, self).initialize()
+        solution = self._randomSolution()
+        self._neighborhood = self._problem.swapNeighborhood(
+            solution, self._problem.evaluate(solution))
+        self._firstSol = self._bestSol = (
+            list(self._neighborhood.getSolution()),
+            self._neighborhood.getValue())
+        # pairs of variables (i, j), i < j
+        self._pairs = np.triu_indices(len(self._scope), 1)
+
+    def _chooseMove(self):
+        """
+        Returns the best swap that is not tabu, or that leads to a better
+        solution than the best one. Moves are considered from the best to
+        the worst one, so only a few tabu tests are performed in general.
+        Returns None if all the moves are tabu.
+        """
+        solution = self._neighborhood.getSolution()
+        value = self._neighborhood.getValue()
+        deltas = self._neighborhood.getDeltas()[self._pairs]
+        for move in np.argsort(deltas * self._orientation, kind='mergesort'):
+            i, j = int(self._pairs[0][move]), int(self._pairs[1][move])
+            if (i, solution[j]) not in self._tabu and \
+                    (j, solution[i]) not in self._tabu:
+                return i, j
+            if self._problem.isBetter(value + deltas[move], self._bestSol[1]):
+                self._nbAspirations += 1
+                return i, j
+        return None
+
+    def measure(self, lastMeasure=None, m=None):
+        if m is None:
+            m = {}
+        m['best'] = self._bestSol[1]
+        m['current'] = self._neighborhood.getValue()
+        m['moves'] = self._nbMoves
+        m['aspirations'] = self._nbAspirations
+        m['valueIncreasePerSecond'] = \
+            abs(self._bestSol[1] - self._firstSol[1]) / \
+            float(time.time() - self._startTime)
+        return super(TabuSearch, self).measure(lastMeasure=lastMeasure, m=m)
+
+    def step(self):
+        """
+        Visualization data exchange protocol: same as the `BruteForce`
+        optimizer, the `current` field holds the solution reached after the
+        move performed at this step.
+        """
+        move = self._chooseMove() if self._nbMoves < self._iterations \
+            else None
+        if move is None:
+            self._log(
+                'Done. Best overall: %s [%.3f]'
+                % (str(self._bestSol[0]), self._bestSol[1]), force=True,
+                level=4)
+            print "Tabu Search optimizing task performed in %.3fs" \
+                % (time.time() - self._start_t)
+            raise OptimizationSolution(*self._bestSol)
+
+        i, j = move
+        solution = self._neighborhood.getSolution()
+        # the variables can't go back to their current values for a while
+        self._tabu.add((i, solution[i]))
+        self._tabu.add((j, solution[j]))
+        self._neighborhood.apply(move)
+        self._nbMoves += 1
+        solution = self._neighborhood.getSolution()
+        value = self._neighborhood.getValue()
+        if self._problem.isBetter(value, self._bestSol[1]):
+            self._bestSol = (list(solution), value)
+            self._log('>>> [%.3f] %s is better!'
+                      % (value, str(self._bestSol[0])),
+                      timeout=0.01, level=3)
+        self._log(
+            'Swapped %d and %d: %s [%.3f]' % (i, j, str(solution), value),
+            level=1)
+        self._viz({
+            'current': {'solution': list(solution), 'evaluation': value},
+            'best': {'solution': self._bestSol[0],
+                     'evaluation': self._bestSol[1]}
+        })
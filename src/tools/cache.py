@@ -0,0 +1,125 @@
+# -*- coding: utf8 -*-
+
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+import hashlib
+
+import numpy as np
+
+"""
+This module contains the memoization cache used by the optimization problems
+to avoid evaluating the same solution twice.
+"""
+
+# approximate memory used by an entry of the cache: the 16 bytes digest and
+# the evaluation, plus the overhead of the python objects and of the ordered
+# dict that holds them.
+ENTRY_BYTES = 200
+
+
+def solutionKey(solution):
+    """
+    Returns a compact key for the given solution: the md5 digest of its
+    values, taken as floats so that `[1, 2]` and `[1.0, 2.0]` share the same
+    key.
+    """
+    return hashlib.md5(
+        np.ascontiguousarray(solution, dtype=float).tostring()).digest()
+
+
+class EvaluationCache(object):
+    """
+    Least recently used cache of the evaluations of the solutions. When the
+    cache is full, the evaluation that has not been read or written for the
+    longest time is evicted.
+    """
+    def __init__(self, entries=0, nbBytes=0):
+        """
+        * entries:int, maximum number of evaluations kept (0 for no limit).
+        * nbBytes:int, approximate maximum memory used by the cache, in bytes
+          (0 for no limit).
+        At least one of the two limits should be set.
+        """
+        super(EvaluationCache, self).__init__()
+        limits = [int(entries)] if int(entries) > 0 else []
+        if int(nbBytes) > 0:
+            limits.append(max(1, int(nbBytes) // ENTRY_BYTES))
+        self._capacity = min(limits)
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key):
+        """
+        Returns the evaluation cached for the given key, None if there is
+        none.
+        """
+        value = self._entries.pop(key, None)
+        if value is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        # most recently used entries are the last ones
+        self._entries[key] = value
+        return value
+
+    def put(self, key, value):
+        """
+        Cache the evaluation of the given key, evicting the least recently
+        used evaluations if needed.
+        """
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        while len(self._entries) > self._capacity:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def clear(self):
+        """
+        Remove all the cached evaluations. The counters are kept.
+        """
+        self._entries.clear()
+
+    def wrap(self, evaluate):
+        """
+        Returns a memoized version of the given evaluation function.
+        """
+        def cachedEvaluate(solution):
+            key = solutionKey(solution)
+            value = self.get(key)
+            if value is None:
+                value = evaluate(solution)
+                self.put(key, value)
+            return value
+        return cachedEvaluate
+
+    def wrapBatch(self, evaluateBatch):
+        """
+        Returns a memoized version of the given batch evaluation function:
+        only the solutions that are not cached are evaluated, at once.
+        """
+        def cachedEvaluateBatch(solutions):
+            solutions = np.asarray(solutions)
+            keys = [solutionKey(solution) for solution in solutions]
+            evaluations = np.array([self.get(key) for key in keys],
+                                   dtype=float)
+            missing = np.flatnonzero(np.isnan(evaluations))
+            if len(missing):
+                evaluations[missing] = evaluateBatch(solutions[missing])
+                for position in missing.tolist():
+                    self.put(keys[position], evaluations[position])
+            return evaluations
+        return cachedEvaluateBatch
+
+    def getStats(self):
+        """
+        Returns the counters of the cache as a dict.
+        """
+        return {
+            'cacheHits': self._hits,
+            'cacheMisses': self._misses,
+            'cacheEvictions': self._evictions,
+            'cacheEntries': len(self._entries)
+        }
@@ -0,0 +1,425 @@
+# -*- coding: utf8 -*-
+
+from __future__ import unicode_literals
+
+import ast
+import math
+import operator
+
+import numpy as np
+
+from mlbExceptions import ExpressionException
+
+"""
+This module compiles the user-defined expressions (see the `Function` problem)
+into python functions.
+An expression is parsed only once: its syntax tree is checked against a
+whitelist of allowed constructs, then compiled into a function of the variable
+`x`. When possible, the expression is also lowered to numpy operations so that
+it can be evaluated over a whole batch of solutions at once.
+"""
+
+# names that can be used in an expression, in addition to the variable `x`
+# and the variables defined by the generators/comprehensions.
+SAFE_GLOBALS = {
+    'len': len, 'range': range, 'xrange': xrange, 'sum': sum, 'abs': abs,
+    'min': min, 'max': max, 'pow': pow, 'float': float, 'int': int,
+    'round': round, 'math': math
+}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.Num, ast.Name, ast.Load, ast.Store, ast.Attribute,
+    ast.Subscript, ast.Index, ast.Slice, ast.Call, ast.Tuple, ast.List,
+    ast.GeneratorExp, ast.ListComp, ast.comprehension, ast.BinOp,
+    ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub, ast.Not, ast.And, ast.Or,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE
+)
+
+# operators and functions, and their numpy counterpart
+BIN_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.div, ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod, ast.Pow: operator.pow
+}
+MATH_FUNCS = {
+    'sqrt': np.sqrt, 'exp': np.exp, 'log': np.log, 'log10': np.log10,
+    'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'asin': np.arcsin,
+    'acos': np.arccos, 'atan': np.arctan, 'sinh': np.sinh, 'cosh': np.cosh,
+    'tanh': np.tanh, 'fabs': np.fabs, 'floor': np.floor, 'ceil': np.ceil
+}
+REDUCERS = {'sum': np.sum, 'min': np.min, 'max': np.max}
+ELEMENTWISE = {'min': np.minimum, 'max': np.maximum}
+
+
+class _NotVectorizable(Exception):
+    """Raised when an expression can't be lowered to numpy operations"""
+    pass
+
+
+def _validate(tree):
+    """
+    Make sure that the given syntax tree only uses whitelisted constructs and
+    names. Raises an `ExpressionException` otherwise.
+    """
+    bound = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.comprehension):
+            for target in ast.walk(node.target):
+                if isinstance(target, ast.Name):
+                    bound.add(target.id)
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ExpressionException(
+                "Forbidden construct in expression: %s"
+                % node.__class__.__name__)
+        if isinstance(node, ast.Name):
+            if node.id.startswith('_') or not (
+                    node.id == 'x' or node.id in SAFE_GLOBALS or
+                    node.id in bound):
+                raise ExpressionException(
+                    "Unknown name in expression: %s" % node.id)
+        if isinstance(node, ast.Attribute):
+            if not isinstance(node.value, ast.Name) \
+                    or node.value.id != 'math' or node.attr.startswith('_') \
+                    or not hasattr(math, node.attr):
+                raise ExpressionException(
+                    "Forbidden attribute in expression: %s" % node.attr)
+        if isinstance(node, ast.Call) and (
+                node.keywords or node.starargs or node.kwargs):
+            raise ExpressionException(
+                "Keyword and star arguments are not allowed in expressions")
+
+
+def _isX(node):
+    return isinstance(node, ast.Name) and node.id == 'x'
+
+
+def _constant(node):
+    """
+    Lower an expression that only depends on the dimension of the solutions
+    (e.g.: `len(x) - 1`). Returns a function of the dimension.
+    """
+    if isinstance(node, ast.Num):
+        return lambda D: node.n
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+            and node.func.id == 'len' and len(node.args) == 1 \
+            and _isX(node.args[0]):
+        return lambda D: D
+    if isinstance(node, ast.BinOp) and type(node.op) in BIN_OPS:
+        op = BIN_OPS[type(node.op)]
+        left, right = _constant(node.left), _constant(node.right)
+        return lambda D: op(left(D), right(D))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        operand = _constant(node.operand)
+        return lambda D: -operand(D)
+    raise _NotVectorizable()
+
+
+def _offset(node, name):
+    """
+    Returns `c` if the given index expression has the form `name`,
+    `name + c`, `c + name` or `name - c` where `c` is a constant expression,
+    raise `_NotVectorizable` otherwise.
+    """
+    def isName(n):
+        return isinstance(n, ast.Name) and n.id == name
+    if isName(node):
+        return lambda D: 0
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        if isName(node.left):
+            return _constant(node.right)
+        if isName(node.right):
+            return _constant(node.left)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Sub) \
+            and isName(node.left):
+        c = _constant(node.right)
+        return lambda D: -c(D)
+    raise _NotVectorizable()
+
+
+def _integer(value):
+    """
+    Returns the given index, raise a `TypeError` unless it is an integer, as
+    indexing a list would.
+    """
+    if not isinstance(value, (int, long)):
+        raise TypeError("Expression indices must be integers, not %s"
+                        % type(value).__name__)
+    return value
+
+
+def _float(value):
+    """
+    The values that only depend on the variable of a generator over a range
+    are computed with python integers (an array of objects), exactly as when
+    evaluating the expression for a single solution. Returns them as floats
+    to combine them with the values of the solutions, any other value is
+    returned as is.
+    """
+    if isinstance(value, np.ndarray) and value.dtype == object:
+        return value.astype(float)
+    return value
+
+
+def _combine(func, left, right):
+    """
+    Apply a binary numpy function, converting the exact integer values to
+    floats only if the other operand depends on the solutions.
+    """
+    if isinstance(left, np.ndarray) and isinstance(right, np.ndarray) and \
+            (left.dtype == object) != (right.dtype == object):
+        left, right = _float(left), _float(right)
+    return func(left, right)
+
+
+def _columns(X, start, stop):
+    """
+    Returns the columns [start, stop) of X, using python's semantic for
+    negative indices.
+    """
+    if 0 <= start and stop <= X.shape[1]:
+        return X[:, start:stop]
+    indices = np.arange(start, stop)
+    if len(indices) and (indices.max() >= X.shape[1] or
+                         indices.min() < -X.shape[1]):
+        raise IndexError("Expression index out of range")
+    return X[:, indices]
+
+
+def _reduce(reducer, values, width):
+    """
+    Reduce the values computed for each element of a generator (one column
+    per element) into a single column.
+    """
+    values = np.asarray(values)
+    if values.ndim < 2 or values.shape[1] != width:
+        values = values + np.zeros((1, width), dtype=values.dtype)
+    return reducer(values, axis=1, keepdims=True)
+
+
+def _lowerGenerator(node):
+    """
+    Lower a generator or a list comprehension over `xrange(...)`/`range(...)`
+    or over `x` itself. Returns a function of the batch that returns the
+    values of each element as columns, and the number of elements.
+    """
+    if len(node.generators) != 1:
+        raise _NotVectorizable()
+    generator = node.generators[0]
+    if generator.ifs or not isinstance(generator.target, ast.Name):
+        raise _NotVectorizable()
+    name = generator.target.id
+    if _isX(generator.iter):
+        element = _lower(node.elt, (name, 'value'))
+        return lambda X: (element(X, (0, X.shape[1])), X.shape[1])
+    if not isinstance(generator.iter, ast.Call) \
+            or not isinstance(generator.iter.func, ast.Name) \
+            or generator.iter.func.id not in ('range', 'xrange') \
+            or len(generator.iter.args) not in (1, 2):
+        raise _NotVectorizable()
+    bounds = [_constant(arg) for arg in generator.iter.args]
+    if len(bounds) == 1:
+        bounds.insert(0, lambda D: 0)
+    element = _lower(node.elt, (name, 'index'))
+
+    def generate(X):
+        start = int(bounds[0](X.shape[1]))
+        stop = max(start, int(bounds[1](X.shape[1])))
+        return element(X, (start, stop)), stop - start
+    return generate
+
+
+def _lower(node, binding=None):
+    """
+    Lower the given node to a function `f(X, rng)` that computes its value for
+    the whole batch `X` (an array of shape (N, D)). The value is either a
+    scalar or a 2D array that broadcasts to (N, K), where K is the number of
+    elements of the enclosing generator, if any (in that case `rng` holds the
+    range of this generator, and `binding` the name and kind of its variable)
+    Raises `_NotVectorizable` if the node can't be lowered.
+    """
+    if isinstance(node, ast.Num):
+        return lambda X, rng: node.n
+
+    if isinstance(node, ast.Name):
+        if binding is not None and node.id == binding[0]:
+            if binding[1] == 'value':
+                return lambda X, rng: X
+            # python integers, that don't wrap around
+            return lambda X, rng: np.arange(
+                rng[0], rng[1]).astype(object)[None, :]
+        raise _NotVectorizable()
+
+    if isinstance(node, ast.Attribute):
+        value = getattr(math, node.attr)
+        if isinstance(value, float):
+            return lambda X, rng: value
+        raise _NotVectorizable()
+
+    if isinstance(node, ast.Subscript) and _isX(node.value) \
+            and isinstance(node.slice, ast.Index):
+        if binding is not None and binding[1] == 'index':
+            try:
+                offset = _offset(node.slice.value, binding[0])
+            except _NotVectorizable:
+                offset = None
+            if offset is not None:
+                return lambda X, rng: _columns(
+                    X, rng[0] + _integer(offset(X.shape[1])),
+                    rng[1] + _integer(offset(X.shape[1])))
+        index = _constant(node.slice.value)
+        return lambda X, rng: X[:, [_integer(index(X.shape[1]))]]
+
+    if isinstance(node, ast.BinOp):
+        op = BIN_OPS[type(node.op)]
+        left, right = _lower(node.left, binding), _lower(node.right, binding)
+        return lambda X, rng: _combine(op, left(X, rng), right(X, rng))
+
+    if isinstance(node, ast.UnaryOp) \
+            and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = _lower(node.operand, binding)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        return lambda X, rng: -operand(X, rng)
+
+    if isinstance(node, ast.Call):
+        args = node.args
+        if isinstance(node.func, ast.Attribute):
+            if node.func.attr not in MATH_FUNCS or len(args) != 1:
+                raise _NotVectorizable()
+            func = MATH_FUNCS[node.func.attr]
+            arg = _lower(args[0], binding)
+            return lambda X, rng: func(_float(arg(X, rng)))
+        name = node.func.id
+        if name == 'len':
+            value = _constant(node)
+            return lambda X, rng: value(X.shape[1])
+        if name == 'abs' and len(args) == 1:
+            arg = _lower(args[0], binding)
+            return lambda X, rng: np.abs(arg(X, rng))
+        if name == 'pow' and len(args) == 2:
+            base, exponent = _lower(args[0], binding), \
+                _lower(args[1], binding)
+            return lambda X, rng: _combine(
+                np.power, base(X, rng), exponent(X, rng))
+        if name in REDUCERS and len(args) == 1 and binding is None:
+            reducer = REDUCERS[name]
+            if _isX(args[0]):
+                return lambda X, rng: reducer(X, axis=1, keepdims=True)
+            if isinstance(args[0], (ast.GeneratorExp, ast.ListComp)):
+                generate = _lowerGenerator(args[0])
+
+                def reduceGenerator(X, rng):
+                    values, width = generate(X)
+                    return _reduce(reducer, values, width)
+                return reduceGenerator
+        if name in ELEMENTWISE and len(args) >= 2:
+            func = ELEMENTWISE[name]
+            lowered = [_lower(arg, binding) for arg in args]
+            return lambda X, rng: reduce(
+                lambda a, b: _combine(func, a, b),
+                [arg(X, rng) for arg in lowered])
+
+    raise _NotVectorizable()
+
+
+class CompiledExpression(object):
+    """
+    An expression of the variable `x` (a vector), compiled once and for all.
+    Call the object with a solution to evaluate the expression for this
+    solution, or use `evaluateBatch` to evaluate it for many solutions at once.
+    """
+    def __init__(self, source):
+        """
+        Parse, check and compile the given expression.
+        * source:string, the python expression to compile.
+        Raises an `ExpressionException` if the expression is not valid or uses
+        anything else than basic arithmetic, comprehensions, the functions
+        defined in `SAFE_GLOBALS` and the `math` module.
+        """
+        super(CompiledExpression, self).__init__()
+        self._source = source
+        try:
+            tree = ast.parse(source.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ExpressionException("Invalid expression: %s" % e)
+        _validate(tree)
+
+        # compile `lambda x: <expression>`, all the other names are resolved
+        # as globals.
+        function = ast.Expression(body=ast.Lambda(
+            args=ast.arguments(
+                args=[ast.Name(id=str('x'), ctx=ast.Param())],
+                vararg=None, kwarg=None, defaults=[]),
+            body=tree.body))
+        ast.fix_missing_locations(function)
+        self._function = eval(
+            compile(function, '<expression>', 'eval'),
+            dict(SAFE_GLOBALS, __builtins__={}))
+
+        try:
+            self._vectorized = _lower(tree.body)
+        except _NotVectorizable:
+            self._vectorized = None
+
+    def __call__(self, solution):
+        return self._function(solution)
+
+    def isVectorized(self):
+        """
+        Returns True if the expression has been lowered to numpy operations.
+        """
+        return self._vectorized is not None
+
+    def checkBatch(self, solutions, tolerance=1e-9):
+        """
+        Compare the vectorized evaluation of each of the given solutions to
+        its evaluation by the compiled python function, and stop using the
+        numpy operations if one of them differs (relative difference above
+        `tolerance`). The solutions for which the python function raises
+        are ignored. Returns True if the expression is still vectorized.
+        """
+        if self._vectorized is None:
+            return False
+        for solution in np.asarray(solutions, dtype=float).tolist():
+            try:
+                expected = float(self._function(solution))
+            except (ArithmeticError, ValueError, IndexError, TypeError):
+                continue
+            try:
+                with np.errstate(all='ignore'):
+                    value = float(self.evaluateBatch([solution])[0])
+            except (ArithmeticError, ValueError, IndexError, TypeError):
+                value = None
+            if value is None or value != expected and \
+                    not abs(value - expected) <= tolerance * abs(expected):
+                self._vectorized = None
+                return False
+        return True
+
+    def evaluateBatch(self, solutions):
+        """
+        Evaluate the expression for each row of the given 2D array. Returns a
+        one-dimensional numpy array of floats.
+        If the expression has not been lowered to numpy operations, it is
+        evaluated one row at a time.
+        Note: the exceptions raised while computing a vectorized expression
+        (e.g.: an index out of range) are not caught.
+        """
+        solutions = np.asarray(solutions, dtype=float)
+        if self._vectorized is None:
+            return np.array([self._function(solution)
+                             for solution in solutions.tolist()],
+                            dtype=float)
+        evaluations = np.asarray(
+            self._vectorized(solutions, None), dtype=float)
+        if evaluations.ndim == 2 and evaluations.shape[1] == 1:
+            evaluations = evaluations[:, 0]
+        if evaluations.ndim == 0 or evaluations.shape == (1,):
+            evaluations = np.repeat(evaluations, len(solutions))
+        if evaluations.shape != (len(solutions),):
+            raise ValueError(
+                "Expression `%s` does not evaluate to a scalar" % self._source)
+        return evaluations
@@ -0,0 +1,211 @@
+# -*- coding: utf8 -*-
+
+from __future__ import unicode_literals
+
+import math
+
+import numpy as np
+
+"""
+This module contains the representations of the search spaces explored by the
+exhaustive solvers. A search space can be accessed at random: each solution
+has an index, and any range of indices can be generated without having to
+enumerate the ones before it.
+"""
+
+
+class GridSpace(object):
+    """
+    Regular grid defined by the scope of an optimization problem and a step.
+    Each variable `i` takes the values `min_i + k * step` for `k` in
+    `[0, radix_i)`, and a solution is indexed as a mixed-radix number where
+    the first variable is the least significant digit. Indices can be
+    arbitrary large (python) integers.
+    """
+    def __init__(self, scope, step):
+        """
+        * scope:list, the scope of the problem, as returned by the `getScope`
+          method of an optimization problem.
+        * step:float, the gap between two consecutive values of a variable.
+        """
+        super(GridSpace, self).__init__()
+        self._mins = [var[1] for var in scope]
+        self._step = float(step)
+        # number of values taken by each variable
+        self._radix = [
+            int(math.floor((var[2] - var[1]) / self._step + 1e-9)) + 1
+            for var in scope]
+        self._size = reduce(lambda a, b: a * b, self._radix, 1)
+
+    def getSize(self):
+        """
+        Returns the total number of solutions in the search space.
+        """
+        return self._size
+
+    def getRadix(self):
+        """
+        Returns the number of values taken by each variable.
+        """
+        return list(self._radix)
+
+    def _digits(self, index):
+        if index < 0 or index >= self._size:
+            raise IndexError("Index out of the search space: %s" % index)
+        digits = []
+        for radix in self._radix:
+            index, digit = divmod(index, radix)
+            digits.append(digit)
+        return digits
+
+    def getSolution(self, index):
+        """
+        Returns the solution found at the given index, as a list.
+        """
+        return [low + digit * self._step
+                for low, digit in zip(self._mins, self._digits(index))]
+
+    def getIndex(self, solution):
+        """
+        Returns the index of the given solution. Raises a `ValueError` if the
+        solution does not lie on the grid.
+        """
+        index = 0
+        for value, low, radix in reversed(
+                zip(solution, self._mins, self._radix)):
+            digit = int(round((value - low) / self._step))
+            if digit < 0 or digit >= radix or \
+                    abs(low + digit * self._step - value) > 1e-9 * max(
+                        1, abs(value)):
+                raise ValueError("Solution out of the search space: %s"
+                                 % str(solution))
+            index = index * radix + digit
+        return index
+
+    def getChunk(self, start, stop):
+        """
+        Returns the solutions of indices `[start, stop)` as a 2D numpy array,
+        one solution per row.
+        """
+        stop = min(stop, self._size)
+        offsets = np.arange(stop - start, dtype=np.int64)
+        chunk = np.empty((len(offsets), len(self._radix)))
+        carry = 0
+        # mixed-radix addition of the offsets to the start index
+        for i, (low, radix, digit) in enumerate(
+                zip(self._mins, self._radix, self._digits(start))):
+            values = digit + offsets % radix + carry
+            offsets //= radix
+            carry = values // radix
+            chunk[:, i] = low + (values % radix) * self._step
+        return chunk
+
+    def genChunks(self, start=0, stop=None, chunkSize=1024):
+        """
+        Generate the solutions of indices `[start, stop)` (the whole search
+        space by default) as successive 2D numpy arrays of `chunkSize` rows
+        (the last one may be smaller).
+        """
+        stop = self._size if stop is None else min(stop, self._size)
+        while start < stop:
+            yield self.getChunk(start, min(start + chunkSize, stop))
+            start += chunkSize
+
+
+class PermutationSpace(object):
+    """
+    Permutations of `length` distinct values taken among the given ones, in
+    lexicographic order (the order of `itertools.permutations`).
+    A permutation is indexed by its Lehmer code: the `k`-th digit is the
+    position of the `k`-th value among the values that are not used by the
+    first `k - 1` ones. The digit `k` takes `n - k` values, and the last
+    digit is the least significant one. Indices (ranks) can be arbitrary
+    large (python) integers.
+    """
+    def __init__(self, values, length):
+        """
+        * values:list, the distinct values that are permuted.
+        * length:int, the number of values of a permutation.
+        """
+        super(PermutationSpace, self).__init__()
+        self._values = np.array(values)
+        self._length = length
+        self._radix = [len(values) - k for k in xrange(length)]
+        self._size = reduce(lambda a, b: a * b, self._radix, 1)
+
+    def getSize(self):
+        """
+        Returns the total number of permutations in the search space.
+        """
+        return self._size
+
+    def _digits(self, index):
+        if index < 0 or index >= self._size:
+            raise IndexError("Index out of the search space: %s" % index)
+        digits = [0] * self._length
+        for k in reversed(xrange(self._length)):
+            index, digits[k] = divmod(index, self._radix[k])
+        return digits
+
+    def getSolution(self, index):
+        """
+        Returns the permutation of the given rank, as a list.
+        """
+        unused = self._values.tolist()
+        return [unused.pop(digit) for digit in self._digits(index)]
+
+    def getIndex(self, solution):
+        """
+        Returns the rank of the given permutation. Raises a `ValueError` if
+        the solution is not a permutation of the values of the space.
+        """
+        unused = self._values.tolist()
+        if len(solution) != self._length:
+            raise ValueError("Solution out of the search space: %s"
+                             % str(solution))
+        index = 0
+        for value, radix in zip(solution, self._radix):
+            if value not in unused:
+                raise ValueError("Solution out of the search space: %s"
+                                 % str(solution))
+            index = index * radix + unused.index(value)
+            unused.remove(value)
+        return index
+
+    def getChunk(self, start, stop):
+        """
+        Returns the permutations of ranks `[start, stop)` as a 2D numpy array,
+        one permutation per row.
+        """
+        stop = min(stop, self._size)
+        offsets = np.arange(stop - start, dtype=np.int64)
+        digits = np.empty((len(offsets), self._length), dtype=np.int64)
+        carry = 0
+        # mixed-radix addition of the offsets to the Lehmer code of the start
+        for k, digit in reversed(list(enumerate(self._digits(start)))):
+            values = digit + offsets % self._radix[k] + carry
+            offsets //= self._radix[k]
+            carry = values // self._radix[k]
+            digits[:, k] = values % self._radix[k]
+        # then decode the Lehmer codes: the value of the digit `k` is the
+        # `digit`-th value not used yet
+        chunk = np.empty(digits.shape, dtype=self._values.dtype)
+        unused = np.ones((len(digits), len(self._values)), dtype=bool)
+        rows = np.arange(len(digits))
+        for k in xrange(self._length):
+            positions = np.argmax(
+                np.cumsum(unused, axis=1) > digits[:, k, None], axis=1)
+            unused[rows, positions] = False
+            chunk[:, k] = self._values[positions]
+        return chunk
+
+    def genChunks(self, start=0, stop=None, chunkSize=1024):
+        """
+        Generate the permutations of ranks `[start, stop)` (the whole search
+        space by default) as successive 2D numpy arrays of `chunkSize` rows
+        (the last one may be smaller).
+        """
+        stop = self._size if stop is None else min(stop, self._size)
+        while start < stop:
+            yield self.getChunk(start, min(start + chunkSize, stop))
+            start += chunkSize
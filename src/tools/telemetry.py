@@ -0,0 +1,177 @@
+# -*- coding: utf8 -*-
+
+from __future__ import unicode_literals
+
+import errno
+import fcntl
+import json
+import mmap
+import os
+import struct
+import time
+
+"""
+This module contains the channel used by a solver process to send its log,
+visualization and measurement messages to the server process.
+"""
+
+# kinds of the records, and the names of the matching streams
+LOG, VIZ, MSR = 0, 1, 2
+STREAMS = ['log', 'viz', 'msr']
+
+# header of the shared memory: the write and read positions, as counters of
+# the bytes written and read since the creation of the channel
+POSITIONS = struct.Struct(str('<QQ'))
+# header of a record: kind, level and length of the payload
+RECORD = struct.Struct(str('<BBI'))
+
+# default size of the ring buffer, in bytes
+BUFFER_SIZE = 4 * 1024 * 1024
+
+
+class TelemetryChannel(object):
+    """
+    Ring buffer in shared memory, holding the messages of the three streams
+    of a solver (log, viz and msr) in the order they were sent, as typed and
+    length-prefixed records. Each record holds the frame sent as is to the
+    client: the JSON-encoded object `{<stream>: <message>}`, so that the
+    server forwards it without decoding it.
+    There must be a single writer (the solver process, not the processes it
+    may start itself) and a single reader (the server process). The writer
+    signals new records through a pipe, only when the buffer was empty: a
+    reader that has not drained the buffer yet will find them without any
+    system call. The reader should check `pending` after each `receive`, in
+    case records were written meanwhile. Each side publishes its position
+    with a single 8-byte store, so no lock is needed (a lock held by a
+    killed writer would block the reader).
+    Once the reader has called `closeWriter`, the pipe also reaches the end
+    of file when the writer process exits.
+    When the buffer is full, `send` waits for the reader to make room, as a
+    full pipe would: messages are never dropped by the channel itself.
+    Should be created before forking the solver process.
+    """
+    def __init__(self, size=BUFFER_SIZE):
+        """
+        * size:int, size of the ring buffer, in bytes.
+        """
+        super(TelemetryChannel, self).__init__()
+        self._size = int(size)
+        self._memory = mmap.mmap(-1, POSITIONS.size + self._size)
+        POSITIONS.pack_into(self._memory, 0, 0, 0)
+        self._signalReader, self._signalWriter = os.pipe()
+        self._closed = False
+        for fd in [self._signalReader, self._signalWriter]:
+            fcntl.fcntl(fd, fcntl.F_SETFL,
+                        fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+    def fileno(self):
+        """
+        Returns the file descriptor that becomes readable when new records
+        are available.
+        """
+        return self._signalReader
+
+    def closeWriter(self):
+        """
+        Close the writing end of the signal pipe in the reader process.
+        Should be called once the writer process is started.
+        """
+        os.close(self._signalWriter)
+
+    def close(self):
+        """
+        Release the signal pipe and the shared memory in the reader process.
+        The channel can't be used afterwards.
+        """
+        os.close(self._signalReader)
+        self._memory.close()
+
+    def isClosed(self):
+        """
+        Returns True once the writer process has exited, as seen by the last
+        call to `receive` (records may still be pending).
+        """
+        return self._closed
+
+    def _positions(self):
+        return POSITIONS.unpack_from(self._memory, 0)
+
+    def pending(self):
+        """
+        Returns True if records are waiting to be read.
+        """
+        written, read = self._positions()
+        return written != read
+
+    def _copyIn(self, position, data):
+        offset = POSITIONS.size + position % self._size
+        first = min(len(data), POSITIONS.size + self._size - offset)
+        self._memory[offset:offset + first] = data[:first]
+        if first < len(data):
+            self._memory[POSITIONS.size:
+                         POSITIONS.size + len(data) - first] = data[first:]
+
+    def _copyOut(self, position, length):
+        offset = POSITIONS.size + position % self._size
+        first = min(length, POSITIONS.size + self._size - offset)
+        data = self._memory[offset:offset + first]
+        if first < length:
+            data += self._memory[POSITIONS.size:
+                                 POSITIONS.size + length - first]
+        return data
+
+    def send(self, kind, message, level=0):
+        """
+        Append a message to the buffer.
+        * kind:int, the stream of the message: `LOG`, `VIZ` or `MSR`.
+        * message:mixed, any json-dumpable object.
+        * level:int, level of the log messages, in [0, 255]. For the viz
+          and msr messages, 1 if the message must be delivered (it can't be
+          replaced by a more recent one), 0 otherwise.
+        """
+        payload = json.dumps({STREAMS[kind]: message}).encode('utf8')
+        record = RECORD.pack(kind, level, len(payload)) + payload
+        if len(record) > self._size:
+            raise ValueError("Message too large for the telemetry channel: "
+                             "%d bytes" % len(record))
+        written, read = self._positions()
+        while written - read + len(record) > self._size:
+            time.sleep(0.001)
+            read = self._positions()[1]
+        self._copyIn(written, record)
+        # publish the record only once it is complete
+        struct.pack_into(str('<Q'), self._memory, 0, written + len(record))
+        if self._positions()[1] == written:
+            try:
+                os.write(self._signalWriter, b'\0')
+            except OSError as e:
+                # the pipe is full: a signal is pending already
+                if e.errno != errno.EAGAIN:
+                    raise
+
+    def receive(self):
+        """
+        Returns the list of the records available, as (stream, level,
+        frame) tuples where `stream` is 'log', 'viz' or 'msr' and `frame`
+        the encoded message (bytes).
+        Records written while reading do not signal the reader: check
+        `pending` afterwards.
+        """
+        try:
+            while True:
+                if not os.read(self._signalReader, 4096):
+                    self._closed = True
+                    break
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+        written, read = self._positions()
+        records = []
+        while read < written:
+            kind, level, length = RECORD.unpack(
+                self._copyOut(read, RECORD.size))
+            records.append((STREAMS[kind], level,
+                            self._copyOut(read + RECORD.size, length)))
+            read += RECORD.size + length
+        struct.pack_into(str('<Q'), self._memory, POSITIONS.size // 2, read)
+        return records